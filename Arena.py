@@ -9,22 +9,37 @@
 #               Can be used to produce training curve data or to measure final
 #               performance levels. 
 #
-# Notes :
+# Notes : Hands can be played in parallel across several processes. Each hand
+#         reseeds the deck, the players and the global random number generators
+#         from the run's seed (see Seeds.py), so serial and parallel runs with
+#         the same seed give identical results and any hand can be replayed on
+#         its own.
+#
+#         streamHands yields one record per play through instead of returning
+#         arrays at the end; see ResultSink.py for writing them to disk.
+#         streamDeals and playDeals play given deals instead of dealing them,
+#         so that several players can be compared on the same cards.
 #
 # Dependencies:
 #    - Cribbage.py (in local project)
 #    - Deck.py (in local project)
+#    - Seeds.py (in local project)
 #    - Utilities.py (in local project)
-#    - numpy (standard python library)
+#    - numpy (third party library)
+#    - random (standard python library)
+#    - concurrent.futures (standard python library)
 #
 ################################################################################
 
 # Cribbage imports
 from Cribbage import Cribbage
 from Deck import *
+from Seeds import SeedRegistry
 
 # Utility imports
 import numpy as np
+import random
+from concurrent.futures import ProcessPoolExecutor
 from Utilities import *
 
 
@@ -36,113 +51,189 @@ class Arena():
         # Initialize the Cribbage Dojo
         self.repeatFlag = repeatDeck
         self.cribbageDojo = Cribbage(players,None,True,True)
+        if self.repeatFlag:
+            self.deck = RiggedDeck(1)
+        else:
+            self.deck = Deck(1)
         self.verbose = verboseFlag
+        self.instrumentation = None
 
         print("Beginning the Arena between {0} and {1}.".format(self.cribbageDojo.players[0].getName(),self.cribbageDojo.players[1].getName()))
 
-    def playHands(self, numHands):
-        peggingDiff = np.zeros(numHands)
-        handsDiff = np.zeros(numHands)
-        totalPointsDiff = np.zeros(numHands)
-        
-        for handNumber in range(numHands):
+    # Plays numHands hands and returns the pegging, hand and total point
+    # differentials of each one. If numWorkers is greater than one the hands
+    # are split into contiguous shards that are played in a pool of processes,
+    # each with its own copies of the players. The random number generators
+    # are reseeded from seed at the start of every hand, so a run gives the
+    # same results however many workers play it.
+    def playHands(self, numHands, numWorkers=1, seed=None):
+        if numWorkers <= 1:
+            results = self.playHandRange(0, numHands, numHands, seed)
+            if self.instrumentation is not None:
+                self.instrumentation.finish()
+            return results
+
+        if self.instrumentation is not None:
+            raise ValueError("Instrumented runs must be played with one worker")
+
+        if seed is None:
+            seed = random.randrange(2**32)
+        bounds = np.linspace(0, numHands, min(numWorkers, max(numHands, 1)) + 1).astype(int)
+        with ProcessPoolExecutor(max_workers=numWorkers) as executor:
+            shards = [executor.submit(playShard, self.cribbageDojo.players, self.repeatFlag, self.verbose,
+                                      bounds[i], bounds[i + 1], numHands, seed) for i in range(len(bounds) - 1)]
+            results = [shard.result() for shard in shards]
+
+        return [np.concatenate([result[i] for result in results]) for i in range(3)]
+
+    # Times the engine's phases and the players' decisions, and counts calls
+    # to the scoring functions, for the rest of the arena's runs. A summary is
+    # exported at the end of each run. Pass None to stop instrumenting. See
+    # Instrumentation.py.
+    def instrument(self, instrumentation):
+        if self.instrumentation is not None:
+            self.instrumentation.detach()
+        self.instrumentation = None if instrumentation is None else instrumentation.attachArena(self)
+        return instrumentation
+
+    # Plays hands firstHand up to (but not including) lastHand of a run of
+    # numHands hands and returns their differentials.
+    def playHandRange(self, firstHand, lastHand, numHands, seed=None):
+        peggingDiff = np.zeros(lastHand - firstHand)
+        handsDiff = np.zeros(lastHand - firstHand)
+        totalPointsDiff = np.zeros(lastHand - firstHand)
+
+        for record in self.streamHands(firstHand, lastHand, numHands, seed):
+            handIndex = record['hand'] - firstHand
+            peggingDiff[handIndex] += record['pegging']
+            handsDiff[handIndex] += record['hands']
+            totalPointsDiff[handIndex] += record['total']
+
+            if self.verbose and record['dealer'] == 1:
+                print("Hand {0}: Pegging Diff {1}, Hands Diff {2}, Total Diff {3}".format(record['hand']+1, peggingDiff[handIndex], handsDiff[handIndex], totalPointsDiff[handIndex]))
+
+        return [peggingDiff,handsDiff,totalPointsDiff]
+
+    # Generator that plays hands firstHand up to (but not including) lastHand
+    # and yields a record for each play through of each hand, so results can be
+    # processed (or written to a ResultSink) while the run continues. Each hand
+    # is played twice, with the players swapping hands and the deal.
+    def streamHands(self, firstHand, lastHand, numHands=None, seed=None):
+        if numHands is None:
+            numHands = lastHand
+        seeds = None if seed is None else SeedRegistry(seed)
+        for handNumber in range(firstHand, lastHand):
             if handNumber%100 == 0:
                 print("Playing hand {} of {}.".format(handNumber+1,numHands))
+
+            if seeds is not None:
+                seeds.seedHand(None if self.repeatFlag else self.deck, self.cribbageDojo,
+                               self.cribbageDojo.players, handNumber)
                 
             # Initialize the hand
-            if self.repeatFlag:
-                self.deck = RiggedDeck(1)
-                self.deck.shuffle()
-            else:
-                self.deck = Deck(1)
-                self.deck.shuffle()
+            self.deck.shuffle()
             hands = []
-            scores = []
-            pegScores = []
-            handScores = []
 
             # Deal two hands of six
             for i in range(0, self.numPlayers):
                 hands.append([])
-                scores.append(0)
-                pegScores.append(0)
-                handScores.append(0)
                 for j in range(0, 6):
-                    hands[i].append(self.deck.cards.pop())
+                    hands[i].append(self.deck.draw())
 
             if self.verbose:
                 print("Hand 1 is "+cardsString(hands[0]))
                 print("Hand 2 is "+cardsString(hands[1]))
                 
-            starterCard = self.deck.cards.pop()
-
-            # Assign these hands to the players
-            for i in range(len(hands[0])):
-                self.cribbageDojo.players[0].hand.append(Card(hands[0][i].rank, hands[0][i].suit))
-                self.cribbageDojo.players[1].hand.append(Card(hands[1][i].rank, hands[1][i].suit))
-
-            if self.verbose:
-                print(self.cribbageDojo.players[0].getName()+" has the cards "+cardsString(self.cribbageDojo.players[0].hand))
-                print(self.cribbageDojo.players[1].getName()+" has the cards "+cardsString(self.cribbageDojo.players[1].hand))
-
-            # FIRST PLAY THROUGH OF THE HAND
-            self.cribbageDojo.dealer = 0
-            self.cribbageDojo.createCrib()
-            self.cribbageDojo.cut(starterCard)
-            if self.verbose:
-                print("The starter card is cut: "+str(self.cribbageDojo.starter))
-            self.cribbageDojo.play()
-            for i in range(self.numPlayers):
-                pegScores[i] = self.cribbageDojo.players[i].pips
-            self.cribbageDojo.scoreHands()
-            for i in range(self.numPlayers):
-                scores[i] = self.cribbageDojo.players[i].pips
-                handScores[i] = scores[i] - pegScores[i]
-            self.cribbageDojo.resetGame()
-
-            peggingDiff[handNumber] = peggingDiff[handNumber] + pegScores[0] - pegScores[1]
-            handsDiff[handNumber] = handsDiff[handNumber] + handScores[0] - handScores[1]
-            totalPointsDiff[handNumber] = totalPointsDiff[handNumber] + scores[0] - scores[1]
-
-            if self.verbose:
-                print("Hand Play 1 --> Peg: {0}-{1} ({2}), Hands: {3}-{4} ({5}), Total: {6}-{7} ({8})".format(pegScores[0],pegScores[1],peggingDiff[handNumber],handScores[0],handScores[1],handsDiff[handNumber],scores[0],scores[1],totalPointsDiff[handNumber]))
-
-
-            # Assign the opposite hands to the players
-            for i in range(len(hands[0])):
-                self.cribbageDojo.players[1].hand.append(Card(hands[0][i].rank, hands[0][i].suit))
-                self.cribbageDojo.players[0].hand.append(Card(hands[1][i].rank, hands[1][i].suit))
-                
-            for i in range(self.numPlayers):
-                pegScores[i] = 0
-                handScores[i] = 0
-
-            if self.verbose:
-                print(self.cribbageDojo.players[0].getName()+" has the cards "+cardsString(self.cribbageDojo.players[0].hand))
-                print(self.cribbageDojo.players[1].getName()+" has the cards "+cardsString(self.cribbageDojo.players[1].hand))
-
-
-            # SECOND PLAY THROUGH OF THE HAND
-            self.cribbageDojo.dealer = 1
-            self.cribbageDojo.createCrib()
-            self.cribbageDojo.cut(starterCard)
-            if self.verbose:
-                print("The starter card is cut: "+str(self.cribbageDojo.starter))
-            self.cribbageDojo.play()
-            for i in range(self.numPlayers):
-                pegScores[i] = self.cribbageDojo.players[i].pips
-            self.cribbageDojo.scoreHands()
-            for i in range(self.numPlayers):
-                scores[i] = self.cribbageDojo.players[i].pips
-                handScores[i] = scores[i] - pegScores[i]
-            self.cribbageDojo.resetGame()
-            
-            peggingDiff[handNumber] = peggingDiff[handNumber] + pegScores[0] - pegScores[1]
-            handsDiff[handNumber] = handsDiff[handNumber] + handScores[0] - handScores[1]
-            totalPointsDiff[handNumber] = totalPointsDiff[handNumber] + scores[0] - scores[1]
-            
-            if self.verbose:
-                print("Hand Play 2 --> Peg: {0}-{1} ({2}), Hands: {3}-{4} ({5}), Total: {6}-{7} ({8})".format(pegScores[0],pegScores[1],peggingDiff[handNumber],handScores[0],handScores[1],handsDiff[handNumber],scores[0],scores[1],totalPointsDiff[handNumber]))
-                print("Hand {0}: Pegging Diff {1}, Hands Diff {2}, Total Diff {3}".format(handNumber+1, peggingDiff[handNumber], handsDiff[handNumber], totalPointsDiff[handNumber]))
-            
-        return [peggingDiff,handsDiff,totalPointsDiff]
\ No newline at end of file
+            starterCard = self.deck.draw()
+
+            yield from self.playDeal(handNumber, hands[0], hands[1], starterCard)
+
+    # Generator that plays each of a sequence of given deals, instead of
+    # dealing from the deck, and yields a record for each play through. A deal
+    # is 13 card ids: the first hand, the second hand and the starter (see
+    # Evaluation.py). Deals are numbered (and seeded) from firstHand.
+    def streamDeals(self, deals, firstHand=0, seed=None):
+        seeds = None if seed is None else SeedRegistry(seed)
+        for i, deal in enumerate(deals):
+            handNumber = firstHand + i
+            if seeds is not None:
+                seeds.seedHand(None, self.cribbageDojo, self.cribbageDojo.players, handNumber)
+            cards = [CARDS[int(cardId)] for cardId in deal]
+            yield from self.playDeal(handNumber, cards[0:6], cards[6:12], cards[12])
+
+    # Plays the given deals and returns the records of their play throughs, in
+    # order. Like playHands, the deals can be split across a pool of processes
+    # without changing the results.
+    def playDeals(self, deals, numWorkers=1, seed=None):
+        if numWorkers <= 1:
+            return list(self.streamDeals(deals, 0, seed))
+
+        bounds = np.linspace(0, len(deals), min(numWorkers, max(len(deals), 1)) + 1).astype(int)
+        with ProcessPoolExecutor(max_workers=numWorkers) as executor:
+            shards = [executor.submit(playDealShard, self.cribbageDojo.players, self.verbose,
+                                      deals[bounds[i]:bounds[i + 1]], bounds[i], seed)
+                      for i in range(len(bounds) - 1)]
+            return [record for shard in shards for record in shard.result()]
+
+    # Plays a deal twice, with the players swapping hands and the deal, and
+    # yields the record of each play through
+    def playDeal(self, handNumber, firstHand, secondHand, starterCard):
+        # FIRST PLAY THROUGH OF THE HAND
+        yield self.playThrough(handNumber, 0, firstHand, secondHand, starterCard)
+
+        # SECOND PLAY THROUGH OF THE HAND, with the opposite hands
+        yield self.playThrough(handNumber, 1, secondHand, firstHand, starterCard)
+
+    # Plays a single hand of a seeded run again, without playing the hands
+    # before it, and returns the records of its two play throughs
+    def replayHand(self, handNumber, seed):
+        return list(self.streamHands(handNumber, handNumber + 1, handNumber + 1, seed))
+
+    # Plays one hand with the given dealer, hands and starter card and returns a
+    # record of the result
+    def playThrough(self, handNumber, dealer, firstHand, secondHand, starterCard):
+        pegScores = [0] * self.numPlayers
+        handScores = [0] * self.numPlayers
+        scores = [0] * self.numPlayers
+
+        # Assign these hands to the players
+        self.cribbageDojo.players[0].hand.extend(firstHand)
+        self.cribbageDojo.players[1].hand.extend(secondHand)
+
+        if self.verbose:
+            print(self.cribbageDojo.players[0].getName()+" has the cards "+cardsString(self.cribbageDojo.players[0].hand))
+            print(self.cribbageDojo.players[1].getName()+" has the cards "+cardsString(self.cribbageDojo.players[1].hand))
+
+        self.cribbageDojo.dealer = dealer
+        self.cribbageDojo.createCrib()
+        throws = tuple(card.id for card in self.cribbageDojo.crib)
+        self.cribbageDojo.cut(starterCard)
+        if self.verbose:
+            print("The starter card is cut: "+str(self.cribbageDojo.starter))
+        self.cribbageDojo.play()
+        for i in range(self.numPlayers):
+            pegScores[i] = self.cribbageDojo.players[i].pips
+        self.cribbageDojo.scoreHands()
+        for i in range(self.numPlayers):
+            scores[i] = self.cribbageDojo.players[i].pips
+            handScores[i] = scores[i] - pegScores[i]
+        self.cribbageDojo.resetGame()
+
+        record = {'hand': handNumber, 'dealer': dealer, 'starter': starterCard.id, 'throws': throws,
+                  'pegging': pegScores[0] - pegScores[1], 'hands': handScores[0] - handScores[1],
+                  'total': scores[0] - scores[1]}
+
+        if self.verbose:
+            print("Hand Play {0} --> Peg: {1}-{2} ({3}), Hands: {4}-{5} ({6}), Total: {7}-{8} ({9})".format(dealer+1,pegScores[0],pegScores[1],record['pegging'],handScores[0],handScores[1],record['hands'],scores[0],scores[1],record['total']))
+
+        return record
+
+# Plays one shard of a parallel run in a worker process
+def playShard(players, repeatFlag, verboseFlag, firstHand, lastHand, numHands, seed):
+    arena = Arena(players, repeatFlag, verboseFlag)
+    return arena.playHandRange(firstHand, lastHand, numHands, seed)
+
+# Plays one shard of the given deals in a worker process
+def playDealShard(players, verboseFlag, deals, firstHand, seed):
+    arena = Arena(players, False, verboseFlag)
+    return list(arena.streamDeals(deals, firstHand, seed))
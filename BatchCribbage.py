@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+
+################################################################################
+#
+# File : BatchCribbage.py
+# Authors : Kjartan, Tristan
+#
+# Description : Plays thousands of hands of cribbage at once, in lockstep, with
+#               NumPy arrays in place of Cards, Players and the Cribbage engine.
+#
+# Notes : Every step of a hand (dealing, throwing, each turn of pegging, goes
+#         and 31s, and scoring the hands and crib) is done for the whole batch
+#         with array operations. Cards are card ids, and a played card's slot in
+#         a hand is set to -1. Hands are scored with Scoring.scoreHandArrays.
+#
+#         Like Arena.playHands, each deal is played twice with the players
+#         swapping hands and the deal, and the pegging, hand and total point
+#         differentials are reported from the first player's side. Nobs on the
+#         cut counts towards pegging, as it does in Arena.
+#
+#         Policies stand in for players. RandomPolicy and MyrmidonPolicy make
+#         the same choices as PlayerRandom and Myrmidon (including their tie
+#         breaking), so batch results match the reference engine's in
+#         distribution, not hand by hand.
+#
+# Dependencies:
+#    - Deck.py (in local project)
+#    - Scoring.py (in local project)
+#    - numpy (third party library)
+#    - itertools (standard python library)
+#
+################################################################################
+
+# Cribbage imports
+from Deck import CARD_RANKS, CARD_VALUES, Rank
+from Scoring import scoreHandArrays
+
+# Utility imports
+import numpy as np
+from itertools import combinations
+
+# Rank and count value of each card id, with -1 (an empty slot) at the end so
+# empty slots can be looked up too. An empty slot never fits in the count.
+_RANKS = np.append(CARD_RANKS.astype(np.int16), 0)
+_VALUES = np.append(CARD_VALUES.astype(np.int16), 99)
+
+# The positions kept and thrown for each of the fifteen throws from six cards,
+# in the order itertools.combinations gives them, and which positions are in
+# each
+KEEPS = np.array(list(combinations(range(6), 4)))
+THROWS = np.array(list(combinations(range(6), 2)))
+KEEP_MEMBERS = np.zeros((len(KEEPS), 6), dtype=np.int64)
+KEEP_MEMBERS[np.arange(len(KEEPS))[:, np.newaxis], KEEPS] = 1
+THROW_MEMBERS = np.zeros((len(THROWS), 6), dtype=np.int64)
+THROW_MEMBERS[np.arange(len(THROWS))[:, np.newaxis], THROWS] = 1
+
+# The most cards that can be played in one count between two players
+MAX_COUNT_CARDS = 8
+
+# Returns the points each candidate card (ranks and values, shape (B, k))
+# would score if played onto the current counts. seqRanks holds the ranks
+# played in each count, seqLength how many there are, sameRank how many of the
+# last cards share a rank and count the current counts (all shape (B,)).
+def pegPointsArrays(seqRanks, seqLength, sameRank, count, ranks, values):
+    rows = np.arange(len(count))
+    newCount = count[:, np.newaxis] + values
+    points = 2 * ((newCount == 15) | (newCount == 31))
+
+    # Pairs: the trailing cards of the same rank, plus this one
+    lastRank = seqRanks[rows, np.maximum(seqLength - 1, 0)]
+    lastRank = np.where(seqLength > 0, lastRank, 0)
+    same = np.where(ranks == lastRank[:, np.newaxis], np.minimum(sameRank + 1, 4)[:, np.newaxis], 1)
+    points += same * (same - 1)
+
+    # Runs: walk back over the count while its ranks stay distinct, and keep
+    # the longest window (with the candidate) that is a run
+    seen = np.zeros(len(count), dtype=np.int64)
+    low = np.full(len(count), 14, dtype=np.int16)
+    high = np.zeros(len(count), dtype=np.int16)
+    distinct = np.ones(len(count), dtype=bool)
+    runs = np.zeros(ranks.shape, dtype=np.int16)
+    candidateBits = np.left_shift(1, ranks.astype(np.int64))
+    for back in range(MAX_COUNT_CARDS - 1):
+        index = seqLength - 1 - back
+        rank = seqRanks[rows, np.maximum(index, 0)].astype(np.int64)
+        bit = np.left_shift(1, rank)
+        distinct &= (index >= 0) & ((seen & bit) == 0)
+        seen |= bit
+        low = np.minimum(low, rank)
+        high = np.maximum(high, rank)
+        length = back + 2
+        if length >= 3:
+            isRun = (distinct[:, np.newaxis] & ((seen[:, np.newaxis] & candidateBits) == 0) &
+                     (np.maximum(high[:, np.newaxis], ranks) - np.minimum(low[:, np.newaxis], ranks) == length - 1))
+            runs = np.where(isRun, length, runs)
+    return points + runs
+
+class RandomPolicy:
+    name = "Random"
+
+    # Returns the positions (B, 2) of the two cards to throw from each hand
+    def throw(self, hands, dealerFlags, RNG):
+        return np.argsort(RNG.random(hands.shape), axis=1)[:, :2]
+
+    # Returns the slot of the card to play from each hand, which must be one
+    # of the legal ones where there are any
+    def play(self, hands, legal, points, count, RNG):
+        return np.argmax(np.where(legal, RNG.random(legal.shape), -1), axis=1)
+
+class MyrmidonPolicy:
+    name = "Myrmidon"
+
+    def __init__(self, numSims=5, exact=False):
+        self.numSims = max(numSims, 1)
+        self.exact = exact
+
+    # Total scores of each combination (shape (B, C, k)) over sampled starters,
+    # or over every starter not in the hand in exact mode
+    def simulateScores(self, combinations, unseen, RNG):
+        if self.exact:
+            scores = scoreHandArrays(combinations[:, :, np.newaxis, :], np.arange(52))
+            return (scores * unseen[:, np.newaxis, :]).sum(axis=2)
+        # The ids of the 46 unseen cards of each hand, in order
+        unseenIds = np.argsort(~unseen, axis=1, kind='stable')[:, :46]
+        picks = RNG.integers(0, 46, (len(combinations), combinations.shape[1], self.numSims))
+        starters = np.take_along_axis(unseenIds[:, np.newaxis, :], picks, axis=2)
+        return scoreHandArrays(combinations[:, :, np.newaxis, :], starters).sum(axis=2)
+
+    def throw(self, hands, dealerFlags, RNG):
+        unseen = np.ones((len(hands), 52), dtype=bool)
+        unseen[np.arange(len(hands))[:, np.newaxis], hands] = False
+        keepScores = self.simulateScores(hands[:, KEEPS], unseen, RNG)
+        throwScores = self.simulateScores(hands[:, THROWS], unseen, RNG)
+        # Each card scores the hands it would be kept in, less the cribs it
+        # would be thrown in if it is our crib, or plus them if it isn't. (The
+        # reference's bonus for throwing fives into our own crib compares a
+        # Rank to an int, so it never applies and isn't copied here.)
+        sign = np.where(dealerFlags, -1, 1)[:, np.newaxis]
+        cardScores = keepScores @ KEEP_MEMBERS + sign * (throwScores @ THROW_MEMBERS)
+        return np.argsort(cardScores, axis=1, kind='stable')[:, :2]
+
+    def play(self, hands, legal, points, count, RNG):
+        values = _VALUES[hands]
+        newCount = count[:, np.newaxis] + values
+        scores = 10 * points + _RANKS[hands]
+        scores = np.where((newCount == 5) | (newCount == 10) | (newCount == 21), np.maximum(1, scores - 10), scores)
+        scores = np.where(newCount < 5, scores + 15, scores)
+        return np.argmax(np.where(legal, scores, 0), axis=1)
+
+class BatchCribbage:
+    def __init__(self, policies, seed=None, batchSize=1024):
+        self.policies = policies
+        self.RNG = np.random.default_rng(seed)
+        self.batchSize = batchSize
+
+    # Deals numDeals hands: two hands of six (B, 2, 6) and a starter (B,)
+    def deal(self, numDeals):
+        order = np.argsort(self.RNG.random((numDeals, 52)), axis=1)[:, :13]
+        return order[:, :12].reshape(numDeals, 2, 6), order[:, 12]
+
+    # Each player throws two cards. Returns the kept hands (B, 2, 4) and the
+    # cribs (B, 4).
+    def throw(self, hands, dealers):
+        rows = np.arange(len(hands))
+        kept = np.empty((len(hands), 2, 4), dtype=hands.dtype)
+        thrown = np.empty((len(hands), 2, 2), dtype=hands.dtype)
+        for player in range(2):
+            positions = self.policies[player].throw(hands[:, player], dealers == player, self.RNG)
+            throwMask = np.zeros((len(hands), 6), dtype=bool)
+            throwMask[rows[:, np.newaxis], positions] = True
+            # Kept cards stay in the order they were dealt
+            kept[:, player] = hands[:, player][~throwMask].reshape(-1, 4)
+            thrown[:, player] = hands[:, player][throwMask].reshape(-1, 2)
+        return kept, thrown.reshape(-1, 4)
+
+    # Plays the pegging of every hand in lockstep and returns each player's
+    # points (B, 2)
+    def peg(self, kept, dealers):
+        numHands = len(kept)
+        rows = np.arange(numHands)
+        hands = kept.astype(np.int64).copy()
+        points = np.zeros((numHands, 2), dtype=np.int64)
+        seqRanks = np.zeros((numHands, MAX_COUNT_CARDS), dtype=np.int16)
+        seqLength = np.zeros(numHands, dtype=np.int64)
+        sameRank = np.zeros(numHands, dtype=np.int64)
+        count = np.zeros(numHands, dtype=np.int16)
+        goCounter = np.zeros(numHands, dtype=np.int64)
+        # The player who isn't the dealer plays first
+        toPlay = (dealers + 1) % 2
+        active = np.ones(numHands, dtype=bool)
+
+        while active.any():
+            current = hands[rows, toPlay]
+            legal = (current >= 0) & (count[:, np.newaxis] + _VALUES[current] <= 31)
+            canPlay = legal.any(axis=1) & active
+            candidatePoints = pegPointsArrays(seqRanks, seqLength, sameRank, count, _RANKS[current],
+                                              _VALUES[current])
+
+            choice = np.zeros(numHands, dtype=np.int64)
+            for player in range(2):
+                mine = toPlay == player
+                if mine.any():
+                    choice[mine] = self.policies[player].play(current[mine], legal[mine], candidatePoints[mine],
+                                                              count[mine], self.RNG)
+
+            # Play the chosen cards
+            played = np.flatnonzero(canPlay)
+            slot = choice[played]
+            card = current[played, slot]
+            rank = _RANKS[card]
+            points[played, toPlay[played]] += candidatePoints[played, slot]
+            lastRank = seqRanks[played, np.maximum(seqLength[played] - 1, 0)]
+            sameRank[played] = np.where((seqLength[played] > 0) & (lastRank == rank), sameRank[played] + 1, 1)
+            seqRanks[played, seqLength[played]] = rank
+            seqLength[played] += 1
+            count[played] += _VALUES[card]
+            hands[played, toPlay[played], slot] = -1
+            goCounter[played] = 0
+
+            # Say go. The second go in a row scores a point.
+            go = np.flatnonzero(active & ~canPlay)
+            secondGo = go[goCounter[go] == 1]
+            points[secondGo, toPlay[secondGo]] += 1
+            goCounter[go] += 1
+
+            toPlay = np.where(active, 1 - toPlay, toPlay)
+
+            # Start a new count after a go or 31, unless the cards have run out
+            ended = active & ((goCounter == 2) | (count == 31))
+            cardsLeft = (hands >= 0).any(axis=(1, 2))
+            active &= ~(ended & ~cardsLeft)
+            reset = ended & cardsLeft
+            seqLength[reset] = 0
+            sameRank[reset] = 0
+            count[reset] = 0
+            goCounter[reset] = 0
+
+        return points
+
+    # Plays the deals with the given dealers (B,) and returns the pegging and
+    # hand points of each player, each (B, 2)
+    def playDeals(self, hands, starters, dealers):
+        kept, cribs = self.throw(hands, dealers)
+        rows = np.arange(len(hands))
+        pegPoints = self.peg(kept, dealers)
+        # Nobs on the cut
+        pegPoints[rows, dealers] += 2 * (_RANKS[starters] == Rank.Jack.value)
+        handPoints = scoreHandArrays(kept, starters[:, np.newaxis]).astype(np.int64)
+        handPoints[rows, dealers] += scoreHandArrays(cribs, starters)
+        return pegPoints, handPoints
+
+    # Plays numHands deals, each twice with the hands and deal swapped, and
+    # returns the pegging, hand and total point differentials of each deal
+    # from the first player's side, like Arena.playHands
+    def playHands(self, numHands):
+        peggingDiff = np.zeros(numHands)
+        handsDiff = np.zeros(numHands)
+        for start in range(0, numHands, self.batchSize):
+            size = min(self.batchSize, numHands - start)
+            hands, starters = self.deal(size)
+            # The first play through has the first player dealing, the second
+            # swaps the hands and has the second player deal
+            hands = np.concatenate([hands, hands[:, ::-1]])
+            starters = np.concatenate([starters, starters])
+            dealers = np.repeat([0, 1], size)
+            pegPoints, handPoints = self.playDeals(hands, starters, dealers)
+            pegging = pegPoints[:, 0] - pegPoints[:, 1]
+            handScores = handPoints[:, 0] - handPoints[:, 1]
+            peggingDiff[start:start + size] = pegging[:size] + pegging[size:]
+            handsDiff[start:start + size] = handScores[:size] + handScores[size:]
+        return [peggingDiff, handsDiff, peggingDiff + handsDiff]
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+
+################################################################################
+#
+# File : Benchmark.py
+# Authors : Kjartan, Tristan
+#
+# Description : Measures the speed of scoring, of player decisions and of whole
+#               Arena runs, saves the results as a JSON baseline and compares
+#               later runs against it.
+#
+# Notes : There are three levels of benchmark:
+#           - micro: getScore, getScoreNoStarter and scoreCards on fixed,
+#             seeded corpora of hands and pegging counts
+#           - decision: Myrmidon.throwCribCards and playCard, and
+#             Player_AI.throwCribCards, on fixed deals
+#           - macro: hands per second of Arena.playHands for each pairing
+#
+#         Each timing is the best of several repeats, which is the least
+#         affected by other work on the machine. Output printed by the players
+#         and the engine is discarded while they are timed.
+#
+#         Usage:
+#           python Benchmark.py run [--levels micro decision macro] [--output baseline.json]
+#           python Benchmark.py compare baseline.json [--current current.json] [--threshold 0.1]
+#
+#         compare exits with status 1 if any benchmark is slower than the
+#         baseline by more than the threshold.
+#
+# Dependencies:
+#    - Arena.py (in local project)
+#    - Deck.py (in local project)
+#    - GameState.py (in local project)
+#    - Myrmidon.py (in local project)
+#    - Player_AI.py (in local project)
+#    - PlayerRandom.py (in local project)
+#    - Scoring.py (in local project)
+#    - numpy (third party library)
+#    - argparse, contextlib, json, os, platform, random, sys, time
+#      (standard python library)
+#
+################################################################################
+
+# Cribbage imports
+from Arena import Arena
+from Deck import CARDS
+from GameState import GameState
+from Myrmidon import Myrmidon
+from Player_AI import Player_AI
+from PlayerRandom import PlayerRandom
+from Scoring import getScore, getScoreNoStarter, scoreCards
+
+# Utility imports
+import numpy as np
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+CORPUS_SEED = 421
+CORPUS_SIZE = 1000
+
+# Times number calls of function, repeat times, and returns the best time per
+# call in seconds
+def bestTime(function, repeat=5, number=1):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        for j in range(number):
+            function()
+        elapsed = (time.perf_counter() - start) / number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+# Throws away anything printed while benchmarking
+@contextlib.contextmanager
+def quiet():
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+# A benchmark result: lower values are better for times, higher for rates
+def result(value, unit, higherIsBetter=False):
+    return {'value': value, 'unit': unit, 'higherIsBetter': higherIsBetter}
+
+# Fixed corpora of four card hands with starters, and of pegging counts
+def handCorpus(size=CORPUS_SIZE, seed=CORPUS_SEED):
+    RNG = random.Random(seed)
+    return [RNG.sample(CARDS, 5) for i in range(size)]
+
+def countCorpus(size=CORPUS_SIZE, seed=CORPUS_SEED):
+    RNG = random.Random(seed)
+    counts = []
+    for i in range(size):
+        cards = []
+        total = 0
+        for card in RNG.sample(CARDS, 8):
+            if total + card.pips > 31:
+                break
+            cards.append(card)
+            total += card.pips
+        counts.append(cards)
+    return counts
+
+def microBenchmarks():
+    hands = handCorpus()
+    counts = countCorpus()
+
+    def scoreHands():
+        for cards in hands:
+            getScore(cards[:4], cards[4], False)
+
+    def scoreHandsNoStarter():
+        for cards in hands:
+            getScoreNoStarter(cards[:4], False)
+
+    def scoreCounts():
+        for cards in counts:
+            scoreCards(cards, False)
+
+    return {
+        'micro.getScore': result(bestTime(scoreHands, number=20) / len(hands), 's/call'),
+        'micro.getScoreNoStarter': result(bestTime(scoreHandsNoStarter, number=20) / len(hands), 's/call'),
+        'micro.scoreCards': result(bestTime(scoreCounts, number=20) / len(counts), 's/call'),
+    }
+
+# Fixed six card deals with the dealer alternating
+def dealCorpus(size, seed=CORPUS_SEED):
+    RNG = random.Random(seed)
+    return [(RNG.sample(CARDS, 6), i % 2) for i in range(size)]
+
+def timeThrows(player, deals):
+    state = GameState(2)
+
+    def throw():
+        for hand, dealer in deals:
+            player.reset()
+            player.hand = list(hand)
+            state.dealer = dealer
+            player.throwCribCards(2, state)
+
+    with quiet():
+        return bestTime(throw, 3) / len(deals)
+
+def timePlays(player, deals):
+    # Each kept hand leads a count, and answers the first card of another
+    states = []
+    with quiet():
+        for hand, dealer in deals:
+            player.reset()
+            player.hand = list(hand)
+            state = GameState(2, dealer)
+            player.throwCribCards(2, state)
+            kept = list(player.playhand)
+            lead = next(card for card in CARDS if card not in hand)
+            state.numCards = (4, 4)
+            states.append((kept, state))
+            state = GameState(2, dealer)
+            state.addPlay(lead)
+            state.numCards = (4, 3)
+            states.append((kept, state))
+
+    def play():
+        for kept, state in states:
+            player.playhand = list(kept)
+            player.playCard(state)
+
+    with quiet():
+        return bestTime(play, 3) / len(states)
+
+def decisionBenchmarks(numDeals=50):
+    deals = dealCorpus(numDeals)
+    return {
+        'decision.Myrmidon.throwCribCards': result(timeThrows(Myrmidon(1, 5, False), deals), 's/call'),
+        'decision.Myrmidon.playCard': result(timePlays(Myrmidon(1, 5, False), deals), 's/call'),
+        'decision.Player_AI.throwCribCards': result(timeThrows(Player_AI(1, False), deals), 's/call'),
+    }
+
+# The player pairings played in the macro benchmarks
+PAIRINGS = {
+    'Random-Random': lambda: [PlayerRandom(1, False), PlayerRandom(2, False)],
+    'Myrmidon-Random': lambda: [Myrmidon(1, 5, False), PlayerRandom(2, False)],
+    'Myrmidon-Myrmidon': lambda: [Myrmidon(1, 5, False), Myrmidon(2, 5, False)],
+    'Player_AI-Myrmidon': lambda: [Player_AI(1, False), Myrmidon(2, 5, False)],
+}
+
+def macroBenchmarks(numHands=200, seed=CORPUS_SEED):
+    results = {}
+    for name, pairing in PAIRINGS.items():
+        with quiet():
+            arena = Arena(pairing(), False, False)
+            elapsed = bestTime(lambda: arena.playHands(numHands, seed=seed), 1)
+        results['macro.' + name] = result(numHands / elapsed, 'hands/s', True)
+    return results
+
+LEVELS = {'micro': microBenchmarks, 'decision': decisionBenchmarks, 'macro': macroBenchmarks}
+
+def runBenchmarks(levels=tuple(LEVELS)):
+    results = {}
+    for level in levels:
+        print("Running {} benchmarks...".format(level))
+        results.update(LEVELS[level]())
+    return {
+        'metadata': {'time': time.strftime("%Y-%m-%d %H:%M:%S"), 'python': platform.python_version(),
+                     'numpy': np.__version__, 'machine': platform.platform()},
+        'results': results,
+    }
+
+def saveResults(results, fileName):
+    with open(fileName, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+def loadResults(fileName):
+    with open(fileName) as file:
+        return json.load(file)
+
+# Compares current results with a baseline. Returns the names of the
+# benchmarks that got worse by more than threshold (a fraction).
+def compareResults(baseline, current, threshold=0.1):
+    regressions = []
+    print("{:40} {:>14} {:>14} {:>9}".format("Benchmark", "Baseline", "Current", "Change"))
+    for name in sorted(current['results']):
+        now = current['results'][name]
+        before = baseline['results'].get(name)
+        if before is None:
+            print("{:40} {:>14} {:>14.4g} {:>9}".format(name, "-", now['value'], "new"))
+            continue
+        # Positive changes are improvements
+        change = now['value'] / before['value'] - 1
+        if not now['higherIsBetter']:
+            change = before['value'] / now['value'] - 1
+        flag = ""
+        if change < -threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print("{:40} {:>14.4g} {:>14.4g} {:>+8.1%}{}".format(name, before['value'], now['value'], change, flag))
+    return regressions
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Cribbage benchmarks")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help="run the benchmarks and save the results")
+    run.add_argument('--levels', nargs='+', choices=list(LEVELS), default=list(LEVELS))
+    run.add_argument('--output', default='benchmarkBaseline.json')
+    compare = commands.add_parser('compare', help="compare results against a baseline")
+    compare.add_argument('baseline')
+    compare.add_argument('--current', help="saved results to compare, instead of running the benchmarks")
+    compare.add_argument('--levels', nargs='+', choices=list(LEVELS), default=list(LEVELS))
+    compare.add_argument('--threshold', type=float, default=0.1)
+    arguments = parser.parse_args(arguments)
+
+    if arguments.command == 'run':
+        results = runBenchmarks(arguments.levels)
+        saveResults(results, arguments.output)
+        print("Saved results to {}".format(arguments.output))
+        return 0
+
+    baseline = loadResults(arguments.baseline)
+    if arguments.current is None:
+        current = runBenchmarks(arguments.levels)
+    else:
+        current = loadResults(arguments.current)
+    regressions = compareResults(baseline, current, arguments.threshold)
+    if regressions:
+        print("{} benchmark(s) regressed by more than {:.0%}.".format(len(regressions), arguments.threshold))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -18,7 +18,9 @@
 #
 # Dependencies:
 #    - Deck.py (in local project)
+#    - GameState.py (in local project)
 #    - Scoring.py (in local project)
+#    - Seeds.py (in local project)
 #    - Utilities.py (in local project)
 #    - random (standard python library)
 #
@@ -26,28 +28,39 @@
 
 # Cribbage imports
 from Deck import Rank,Deck,RiggedDeck
-from Scoring import getScore,scoreCards
+from Scoring import getScore
+from GameState import GameState
+from Seeds import SeedRegistry
 
 # Utility imports
 from Utilities import cardsString,areCardsEqual
 import random 
 
 class Cribbage:
-    def __init__(self, playerArray, critic = None, verboseFlag = True, rigged=False):
+    def __init__(self, playerArray, critic = None, verboseFlag = True, rigged=False, seed=None, seedGlobals=True):
+        # If a seed is given, every game, hand and player draws its random
+        # numbers from a stream derived from it. The global random generators
+        # are reseeded too unless seedGlobals is False (for games played in
+        # threads, which share them).
+        self.seedGlobals = seedGlobals
+        if seed is None:
+            self.seeds = None
+            self.RNG = random.Random(random.getrandbits(64))
+        else:
+            self.seeds = SeedRegistry(seed)
+            self.RNG = random.Random(self.seeds.gameSeed(0))
+        self.gameNumber = 0
+        self.handNumber = 0
         # Build a single standard deck
         self.rigged = rigged
         self.createDeck()
         # Initialize and empty crib
         self.crib = []
-        # Initialize a holder for the cut card
-        self.starter = []
-        # Initialize the list of played cards
-        self.playorder = []
-        # Initialize the list of cards currently counting
-        self.inplay = []
+        # Initialize the state shared with the players. It holds the cut card,
+        # the played cards, the cards currently counting and the dealer.
         # Randomly select which player starts with the crib
         # also the dealer
-        self.dealer = random.randint(0, len(playerArray) - 1)
+        self.state = GameState(len(playerArray), self.RNG.randint(0, len(playerArray) - 1))
         # initialize the players
         self.players = playerArray
         self.critic = critic
@@ -58,30 +71,45 @@ class Cribbage:
     # Reset the game's state, but keep the same players. For use during extended
     # training sessions between players.
     def resetGame(self):
-        self.createDeck()
+        self.gameNumber += 1
+        self.handNumber = 0
+        if not(self.seeds is None):
+            self.RNG.seed(self.seeds.gameSeed(self.gameNumber))
         self.deck.shuffle()
         self.crib = []
-        self.starter = []
-        self.playorder = []
-        self.dealer = random.choice(range(len(self.players)))
+        self.state.newHand()
+        self.dealer = self.RNG.choice(range(len(self.players)))
         for player in self.players:
             player.newGame(self.gameState())
+        self.state.updateScores(self.players)
+        self.state.updateNumCards(self.players)
 
-    # Create and return a dictionary structure capturing the game's state. For
-    # use by agents to learn or make decisions.
+    # Return the structure capturing the game's state. For use by agents to
+    # learn or make decisions. The same GameState is kept up to date by the
+    # engine as the game goes, rather than being rebuilt for every call.
     def gameState(self):
-        state = dict()
-        scores = [player.pips for player in self.players]
-        state['scores'] = scores
-        numCards = [len(player.playhand) for player in self.players]
-        state['numCards'] = numCards
-        state['inplay'] = self.inplay
-        state['playorder'] = self.playorder
-        state['dealer'] = self.dealer
-        state['starter'] = self.starter
-        state['count'] = sum([card.value() for card in self.inplay])
+        return self.state
+
+    # The dealer, starter and cards played are kept in the game state
+    @property
+    def dealer(self):
+        return self.state.dealer
+
+    @dealer.setter
+    def dealer(self, dealer):
+        self.state.dealer = dealer
 
-        return state
+    @property
+    def starter(self):
+        return self.state.starter
+
+    @property
+    def inplay(self):
+        return self.state.inplay
+
+    @property
+    def playorder(self):
+        return self.state.playorder
 
     # Check to see if any player has won
     def checkWin(self):
@@ -93,6 +121,10 @@ class Cribbage:
 
     # Play a single hand of cribbage
     def playHand(self):
+        if not(self.seeds is None):
+            self.seeds.seedHand(None if self.rigged else self.deck, self, self.players, self.handNumber, self.gameNumber,
+                                self.seedGlobals)
+        self.handNumber += 1
         self.deal()
         self.createCrib()
         self.cut()
@@ -107,6 +139,7 @@ class Cribbage:
         self.restoreDeck()
         for player in self.players:
             player.reset(self.gameState())
+        self.state.updateNumCards(self.players)
 
     # Play a complete game of cribbage - first to 121 wins!
     def playGame(self):
@@ -141,6 +174,7 @@ class Cribbage:
                 print("{} threw 2 cards into the crib.".format(player.getName()))
             for card in thrown:
                 self.crib.append(card)
+            self.state.updateNumCards(self.players)
 
     # Cut the deck to determine the starter card that will be added to all hands
     # If a card is passed as an argument then it is used as the cut card.
@@ -149,12 +183,13 @@ class Cribbage:
             # Cut the deck
             self.deck.cut()
             # Top card is the starter
-            self.starter = self.deck.cards.pop()
+            self.state.starter = self.deck.draw()
         else:
-            self.starter = card
+            self.state.starter = card
         # If starter is a jack, dealer gets 2 pips
         if self.starter.rank is Rank.Jack:
             self.players[self.dealer].pips += 2
+            self.state.updateScores(self.players)
             if self.verbose:
                 print("{} scores 2 for nobs!".format(self.players[self.dealer].getName()))
 
@@ -166,6 +201,7 @@ class Cribbage:
             player = self.players[i % len(self.players)]
             score = getScore(player.hand, self.starter, self.verbose)
             player.pips += score
+            self.state.updateScores(self.players)
             if self.verbose:
                 print("Scoring {}'s hand: ".format(player.getName()) + cardsString(player.hand) + " + " + str(
                     self.starter))
@@ -174,6 +210,7 @@ class Cribbage:
         if not (self.checkWin()):
             cribScore = getScore(self.crib, self.starter, self.verbose)
             self.players[self.dealer].pips += cribScore
+            self.state.updateScores(self.players)
             if self.verbose:
                 print(
                     "In {}'s crib: ".format(self.players[self.dealer].getName()) + cardsString(self.crib) + " + " + str(
@@ -188,6 +225,7 @@ class Cribbage:
         if self.verbose:
             print("{} dealt this hand.".format(self.players[self.dealer].getName()))
         
+        starter = self.starter
         if not(self.critic is None):
             self.critic.playhand = []
             for i in range(0,4):
@@ -195,18 +233,18 @@ class Cribbage:
             #self.players[0].show()
             #self.critic.show()
         
-        self.playorder = []
+        self.state.newHand()
+        self.state.starter = starter
+        self.state.updateNumCards(self.players)
         
         # Starting player is not the dealer
         toPlay = (self.dealer + 1) % len(self.players)
-        self.playorder = []
         # as long as any player has cards in hand, and the game isn't over
         while (any(len(player.playhand) > 0 for player in self.players)) and (not (self.checkWin())):
-            self.inplay = []  # those cards that affect the current count
-            count = 0  # the current count
+            self.state.newCount()  # the cards that affect the current count and the count
             goCounter = 0  # a counter for the number of consecutive "go"s
 
-            while (count < 31) and (goCounter < 2) and (not (self.checkWin())):
+            while (self.state.count < 31) and (goCounter < 2) and (not (self.checkWin())):
                 if self.verbose:
                     print("It is {}'s turn. Score is ".format(self.players[toPlay].getName()) + self.scoreString())
                 # Call on agent to choose a card
@@ -223,6 +261,7 @@ class Cribbage:
                     else:
                         goCounter = 2
                         self.players[toPlay].pips += 1
+                        self.state.updateScores(self.players)
                         if self.verbose:
                             print("{} scores 1 for the go.\n".format(self.players[toPlay].getName()))
                 else:
@@ -233,12 +272,11 @@ class Cribbage:
                         else:
                             print("{} agrees with {}'s play.".format(self.critic.getName(),self.players[0].getName()))
                         self.critic.removeCard(playedCard)
-                    count += playedCard.value()
-                    self.inplay.append(playedCard)
-                    self.playorder.append(playedCard)
                     if self.verbose:
-                        print("\t{}: ".format(count) + cardsString(self.inplay))
-                    self.players[toPlay].pips += scoreCards(self.inplay, self.verbose)
+                        print("\t{}: ".format(self.state.count + playedCard.value()) + cardsString(self.inplay + (playedCard,)))
+                    self.players[toPlay].pips += self.state.addPlay(playedCard, self.verbose)
+                    self.state.updateNumCards(self.players)
+                    self.state.updateScores(self.players)
                     goCounter = 0
 
                 toPlay = ((toPlay + 1) % len(self.players))
@@ -250,7 +288,7 @@ class Cribbage:
                 for player in self.players:
                     player.go(self.gameState())
 
-            if count == 31:
+            if self.state.count == 31:
                 pass
                 # A 31 has happened
                 for player in self.players:
@@ -266,15 +304,18 @@ class Cribbage:
     # Restore the deck after a hand and "pass it" to the next dealer
     def restoreDeck(self):
         self.dealer = ((self.dealer + 1) % len(self.players))
-        self.createDeck()
+        self.deck.reset()
         self.crib = []
-        self.starter = []
-        self.playorder = []
+        self.state.newHand()
 
-    # Initalizes own deck depending on whether or not a rigged deck should be used
+    # Initalizes own deck depending on whether or not a rigged deck should be used.
+    # The deck is created once and reused for every hand.
     def createDeck(self):
         if self.rigged:
-            self.deck = RiggedDeck(1)
+            if self.seeds is None:
+                self.deck = RiggedDeck(1)
+            else:
+                self.deck = RiggedDeck(1, self.seeds.deckSeed(0, self.gameNumber))
         else:
             self.deck = Deck(1)
 
@@ -10,13 +10,20 @@
 # Notes : Every card has a suit and rank. A card's value is what it contributes
 #         to the count according to the rules of cribbage.
 #
+#         Each card also has an integer id from 0 to 51 (13 * (suit - 1) +
+#         rank - 1). Only one Card object exists per id, so creating a Card
+#         returns the shared instance and cards compare equal only to
+#         themselves.
+#
 # Dependencies:
 #    - enum (standard python library)
+#    - numpy (third party library)
 #    - random (standard python library)
 #
 ################################################################################
 
 from enum import Enum
+import numpy as np
 import random
 
 class Suit(Enum):
@@ -41,28 +48,48 @@ class Rank(Enum):
     King = 13
 
 class Card:
-    def __init__(self, rank, suit):
-        if type(suit) == int:
-            self.suit = Suit(suit)
-        else:
-            self.suit = suit
-
-        if type(rank) == int:
-            self.rank = Rank(rank)
-        else:
-            self.rank = rank
+    # Cards are flyweights: there is exactly one Card object for each of the 52
+    # cards, identified by an integer id (0..51), so cards can be compared by
+    # identity, hashed and stored in sets or as bits in a 52-bit mask.
+    __slots__ = ('id', 'rank', 'suit', 'rankValue', 'pips')
+
+    def __new__(cls, rank, suit):
+        if type(suit) != int:
+            suit = suit.value
+        if type(rank) != int:
+            rank = rank.value
+        return CARDS[13 * (suit - 1) + rank - 1]
+
+    @classmethod
+    def _intern(cls, cardId):
+        card = object.__new__(cls)
+        card.id = cardId
+        card.rank = Rank(cardId % 13 + 1)
+        card.suit = Suit(cardId // 13 + 1)
+        card.rankValue = card.rank.value
+        card.pips = min(card.rankValue, 10)
+        return card
+
+    def __reduce__(self):
+        return (cardFromId, (self.id,))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def __lt__(self, other):
-        return self.rank.value < other.rank.value
+        return self.rankValue < other.rankValue
 
     def __gt__(self, other):
-        return self.rank.value > other.rank.value
+        return self.rankValue > other.rankValue
 
-    def __eq__(self, other):
-        return self.rank.value == other.rank.value
+    def __hash__(self):
+        return self.id
 
     def uid(self):
-        return 13 * (self.suit.value - 1) + self.rank.value
+        return self.id + 1
 
     def getRank(self):
         return self.rank
@@ -71,15 +98,12 @@ class Card:
         return self.suit
 
     def value(self):
-        if self.rank.value > 10:
-            return 10
-        else:
-            return self.rank.value
+        return self.pips
 
     def __str__(self):
         symbols = ["", u"\u2660", u"\u2661", u"\u2662", u"\u2663"]
         vals = ["0", "A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
-        return "{} {}".format(symbols[self.suit.value], vals[self.rank.value])
+        return "{} {}".format(symbols[self.suit.value], vals[self.rankValue])
 
     def show(self):
         print(str(self))
@@ -89,26 +113,85 @@ class Card:
                                                                   self.uid()))
 
     def isIdentical(self, card):
-        return card.uid() == self.uid()
+        return card is self
 
-class Deck:
-    def __init__(self, numDecks):
-        self.cards = []
-        for i in range(1, numDecks + 1):
-            self.build()
+# The 52 interned cards, indexed by card id, and the rank (1-13), count value
+# (1-10) and suit (1-4) of each card id.
+CARDS = tuple(Card._intern(cardId) for cardId in range(52))
+CARD_RANKS = np.array([card.rankValue for card in CARDS], dtype=np.int8)
+CARD_VALUES = np.array([card.pips for card in CARDS], dtype=np.int8)
+CARD_SUITS = np.array([card.suit.value for card in CARDS], dtype=np.int8)
+FULL_MASK = (1 << 52) - 1
+
+def cardFromId(cardId):
+    return CARDS[cardId]
+
+def cardsToIds(cards):
+    return [card.id for card in cards]
+
+def idsToCards(cardIds):
+    return [CARDS[cardId] for cardId in cardIds]
 
-    def build(self):
-        for suit in Suit:
-            for rank in Rank:
-                self.cards.append(Card(rank, suit))
+# Cards can also be stored as a 52-bit mask, with bit i set if card id i is present
+def cardsToMask(cards):
+    mask = 0
+    for card in cards:
+        mask |= 1 << card.id
+    return mask
+
+def maskToCards(mask):
+    return [CARDS[cardId] for cardId in range(52) if (mask >> cardId) & 1]
+
+def isInMask(card, mask):
+    return (mask >> card.id) & 1 == 1
+
+class Deck:
+    # A deck is an array of card ids that is allocated once and reused for every
+    # hand. Shuffling permutes the array in place with the deck's own random
+    # number generator and dealing moves an index down from the top, so no
+    # Card objects or lists are created per hand.
+    def __init__(self, numDecks, seed=None):
+        self.order = list(range(52)) * numDecks
+        self.top = len(self.order)
+        # Unless a seed is given, seed the deck from the global generator so
+        # that seeding random still makes games repeatable
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.RNG = random.Random(seed)
+
+    # The cards left in the deck, from the bottom to the top
+    @property
+    def cards(self):
+        return [CARDS[cardId] for cardId in self.order[:self.top]]
+
+    # Reseed the deck's generator. The cards are put back in their original
+    # order so the shuffles that follow only depend on the seed.
+    def seed(self, seed):
+        self.order.sort()
+        self.RNG.seed(seed)
+
+    # Put every dealt card back in the deck without shuffling
+    def reset(self):
+        self.top = len(self.order)
 
     def shuffle(self):
-        for i in range(random.randint(3, 10)):
-            random.shuffle(self.cards)
+        self.reset()
+        self.RNG.shuffle(self.order)
 
+    # Cut the deck at a random point; the card at the cut is moved to the top so
+    # that it is the next card drawn
     def cut(self):
-        t = random.randint(1, len(self.cards))
-        self.cards = self.cards[t:] + self.cards[:t]
+        t = self.RNG.randint(1, self.top)
+        self.order[t - 1], self.order[self.top - 1] = self.order[self.top - 1], self.order[t - 1]
+
+    # Take the top card off the deck
+    def draw(self):
+        self.top -= 1
+        return CARDS[self.order[self.top]]
+
+    def drawId(self):
+        self.top -= 1
+        return self.order[self.top]
 
     def deal(self, players, numCards):
         for i in range(1, numCards + 1):
@@ -119,17 +202,16 @@ class Deck:
         for card in self.cards:
             card.show()
 
+# A deck that deals the same cards every time it is shuffled
 class RiggedDeck(Deck):
-    def __init__(self, numDecks):
-        super().__init__(numDecks)
-        self.RNG = random.Random(1)
+    def __init__(self, numDecks, seed=1):
+        super().__init__(numDecks, seed)
+        self.fixedSeed = seed
 
     def shuffle(self):
-        self.RNG.seed(1)
-        for i in range(2):
-            self.RNG.shuffle(self.cards)
+        self.seed(self.fixedSeed)
+        super().shuffle()
 
     def cut(self):
-        self.RNG.seed(2)
-        t = self.RNG.randint(1, len(self.cards))
-        self.cards = self.cards[t:] + self.cards[:t]
\ No newline at end of file
+        self.RNG.seed(self.fixedSeed + 1)
+        super().cut()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+
+################################################################################
+#
+# File : DiscardTable.py
+# Authors : Kjartan, Tristan
+#
+# Description : A precomputed table of the best two cards to throw from every
+#               six card hand, for the dealer and for the other player.
+#
+# Notes : Suits only matter to the score through which cards share a suit, so
+#         hands that differ only by renaming suits have the same best throw. A
+#         hand is canonicalized by writing each suit as a 13-bit set of ranks
+#         and sorting the four sets, largest first; the sets packed together
+#         are the hand's key. This cuts the 20 million six card hands down to
+#         about a million.
+#
+#         The builder scores each of the fifteen throws from every canonical
+#         hand by the expected score of the four kept cards over the 46 unseen
+#         starters, plus (for the dealer) or minus the expected score of the
+#         crib the thrown cards go into (see buildCribTable). The sorted
+#         keys and the index of the best throw (into THROWS) for each are saved
+#         alongside this file and memory-mapped.
+#
+#         A lookup canonicalizes the hand, binary searches the keys, and maps
+#         the canonical throw back to real cards through the suit order.
+#
+#         Building the table takes about 15 seconds, after the crib table (see
+#         Scoring.getCribTable) it needs is built. It is built the first time
+#         it is needed, or ahead of time by prebuildTables or by running this
+#         file. The saved files carry DISCARD_TABLE_VERSION in their names.
+#
+# Dependencies:
+#    - Deck.py (in local project)
+#    - Scoring.py (in local project)
+#    - numpy (third party library)
+#    - itertools (standard python library)
+#    - math (standard python library)
+#    - os (standard python library)
+#
+################################################################################
+
+# Cribbage imports
+from Deck import CARDS
+from Scoring import getScoreTable, getCribTable, getThrowScoreTable, loadTables, saveTable, NO_SCORE
+
+# Utility imports
+import numpy as np
+from itertools import chain, combinations
+from math import comb
+import os
+
+# The version of the saved discard table, in its file names. It changes
+# whenever the way throws are valued does, so tables saved by older versions
+# are rebuilt instead of reused. Version 2 values the crib with the crib table.
+DISCARD_TABLE_VERSION = 2
+DISCARD_KEYS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 "discardKeys.v{}.npy".format(DISCARD_TABLE_VERSION))
+DISCARD_TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  "discardTable.v{}.npy".format(DISCARD_TABLE_VERSION))
+
+# Columns of the discard table
+PONE = 0
+DEALER = 1
+
+# The positions thrown and kept for each of the fifteen throws from a sorted
+# six card hand. KEEPS[i] is the complement of THROWS[i].
+THROWS = np.array(list(combinations(range(6), 2)))
+KEEPS = np.array([[j for j in range(6) if j not in throw] for throw in THROWS])
+
+_BINOMIALS = np.array([[comb(n, k) for n in range(52)] for k in range(5)], dtype=np.int64)
+_discardKeys = None
+_discardTable = None
+
+# Returns the canonical key of a hand (a list of cards) and the real suit (0-3)
+# of each canonical suit
+def canonicalize(cards):
+    masks = [0, 0, 0, 0]
+    for card in cards:
+        masks[card.id // 13] |= 1 << (card.id % 13)
+    order = sorted(range(4), key=lambda suit: masks[suit], reverse=True)
+    key = 0
+    for suit in order:
+        key = (key << 13) | masks[suit]
+    return key, order
+
+# Canonical keys of an (N, k) array of card ids
+def canonicalKeys(hands):
+    hands = np.asarray(hands, dtype=np.int64)
+    bits = np.left_shift(1, hands % 13)
+    suits = hands // 13
+    masks = np.stack([(bits * (suits == suit)).sum(axis=1) for suit in range(4)], axis=1)
+    masks = -np.sort(-masks, axis=1)
+    return ((masks[:, 0] << 39) | (masks[:, 1] << 26) | (masks[:, 2] << 13) | masks[:, 3]).astype(np.uint64)
+
+# The sorted canonical card ids (N, k) of an array of canonical keys
+def decodeKeys(keys, handSize=6):
+    keys = np.asarray(keys, dtype=np.uint64)
+    ids = np.arange(52)
+    shifts = (13 * (3 - ids // 13) + ids % 13).astype(np.uint64)
+    present = ((keys[:, np.newaxis] >> shifts) & np.uint64(1)).astype(bool)
+    return np.nonzero(present)[1].reshape(-1, handSize)
+
+# Every canonical key of a six card hand, sorted
+def enumerateCanonicalKeys():
+    keys = []
+    for first, second in combinations(range(52), 2):
+        rest = 52 - second - 1
+        if rest < 4:
+            continue
+        others = np.fromiter(chain.from_iterable(combinations(range(second + 1, 52), 4)), dtype=np.int64)
+        others = others.reshape(-1, 4)
+        hands = np.concatenate([np.full((len(others), 2), (first, second)), others], axis=1)
+        keys.append(np.unique(canonicalKeys(hands)))
+    return np.unique(np.concatenate(keys))
+
+# Number of real hands with each canonical key: the 24 orderings of the suits,
+# less those that only swap suits holding the same ranks
+def orbitSizes(keys):
+    keys = np.asarray(keys, dtype=np.uint64)
+    masks = np.stack([(keys >> np.uint64(13 * (3 - slot))) & np.uint64(0x1FFF) for slot in range(4)], axis=1)
+    symmetries = np.ones(len(keys), dtype=np.int64)
+    run = np.ones(len(keys), dtype=np.int64)
+    for slot in range(1, 4):
+        run = np.where(masks[:, slot] == masks[:, slot - 1], run + 1, 1)
+        symmetries *= run
+    return 24 // symmetries
+
+# The 169 kinds of two card throw up to suit: index 14 * rank for a pair,
+# 13 * low + high if suited and 13 * high + low if not (ranks 0-12)
+def throwClasses(throws):
+    throws = np.asarray(throws, dtype=np.int64)
+    ranks = throws % 13
+    low = ranks.min(axis=1)
+    high = ranks.max(axis=1)
+    suited = throws[:, 0] // 13 == throws[:, 1] // 13
+    return np.where(suited, 13 * low + high, 13 * high + low)
+
+# Every two card throw, in the row order of the crib and throw score tables
+def allThrows():
+    return np.array(sorted(combinations(range(52), 2), key=lambda throw: (throw[1], throw[0])))
+
+# Expected value of each throw, from the player's side, for canonical hands
+# (N, 6 sorted card ids). Returns (N, 15) arrays for the pone and the dealer.
+# Thrown cards are valued by cribTable (see Scoring.getCribTable) if it is
+# given, and otherwise by scoring them with the starter.
+def throwValues(hands, cribTable=None):
+    rows = np.arange(len(hands))[:, np.newaxis]
+    unseen = np.ones((len(hands), 52), dtype=bool)
+    unseen[rows, hands] = False
+
+    keeps = hands[:, KEEPS]
+    keepRows = sum(_BINOMIALS[k + 1][keeps[..., k]] for k in range(4))
+    keepScores = getScoreTable()[keepRows.ravel()].reshape(len(hands), len(KEEPS), 52)
+    keepValues = (keepScores * unseen[:, np.newaxis, :]).sum(axis=2) / 46
+
+    throws = hands[:, THROWS]
+    throwRows = _BINOMIALS[1][throws[..., 0]] + _BINOMIALS[2][throws[..., 1]]
+    if cribTable is not None:
+        return keepValues - cribTable[throwRows, PONE], keepValues + cribTable[throwRows, DEALER]
+    throwScores = getThrowScoreTable()[throwRows.ravel()].reshape(len(hands), len(THROWS), 52)
+    throwValues = (throwScores * unseen[:, np.newaxis, :]).sum(axis=2) / 46
+    return keepValues - throwValues, keepValues + throwValues
+
+# Builds the discard table for every canonical hand. Returns the sorted keys
+# and the (N, 2) best throws for the pone and the dealer.
+def buildDiscardTable(keysFile=None, tableFile=None, chunkSize=20000, cribTable=None):
+    keys = enumerateCanonicalKeys()
+    table = np.empty((len(keys), 2), dtype=np.uint8)
+    for start in range(0, len(keys), chunkSize):
+        hands = decodeKeys(keys[start:start + chunkSize])
+        poneValues, dealerValues = throwValues(hands, cribTable)
+        table[start:start + chunkSize, PONE] = np.argmax(poneValues, axis=1)
+        table[start:start + chunkSize, DEALER] = np.argmax(dealerValues, axis=1)
+
+    if keysFile is not None and tableFile is not None:
+        saveTable(keysFile, keys)
+        saveTable(tableFile, table)
+    return keys, table
+
+# Returns the discard keys and table, loading them from disk (or building them)
+# the first time they are requested
+def getDiscardTable():
+    global _discardKeys, _discardTable
+    if _discardTable is None:
+        _discardKeys, _discardTable = loadTables([DISCARD_KEYS_FILE, DISCARD_TABLE_FILE],
+                                                 lambda: buildDiscardTable(cribTable=getCribTable()),
+                                                 "discard table")
+    return _discardKeys, _discardTable
+
+# Builds (or loads) every precomputed table, so that the first decisions of a
+# run don't wait for them. Call it before starting threads or processes that
+# play games.
+def prebuildTables():
+    getScoreTable()
+    getCribTable()
+    getDiscardTable()
+
+# Builds the table of the expected crib score for every two card throw, for a
+# thrower who isn't the dealer (column PONE) and one who is (column DEALER).
+# The opponent throws the other two cards as the discard table built without
+# crib values would, over every hand it could hold (weighted exactly, by how
+# many real hands share each canonical hand). The starter is any card not in
+# the crib.
+def buildCribTable(fileName=None):
+    keys, table = buildDiscardTable()
+    weights = orbitSizes(keys)
+    hands = decodeKeys(keys)
+    rows = np.arange(len(keys))[:, np.newaxis]
+
+    throws = allThrows()
+    classes = throwClasses(throws)
+    classSizes = np.bincount(classes, minlength=169)
+    scoreTable = getScoreTable()
+    cribTable = np.zeros((len(throws), 2), dtype=np.float32)
+    for column in (PONE, DEALER):
+        # Into the pone's crib the opponent throws as the dealer, and the
+        # other way around
+        opponentThrows = hands[rows, THROWS[table[:, DEALER if column == PONE else PONE]]]
+        frequencies = np.bincount(throwClasses(opponentThrows), weights=weights, minlength=169)
+        throwWeights = (frequencies / np.maximum(classSizes, 1))[classes]
+
+        # Throws of the same kind have the same expected crib
+        for throwClass in np.unique(classes):
+            first, second = throws[np.argmax(classes == throwClass)]
+            others = np.all((throws != first) & (throws != second), axis=1)
+            cribs = np.sort(np.concatenate([np.tile([first, second], (others.sum(), 1)), throws[others]], axis=1))
+            cribRows = sum(_BINOMIALS[k + 1][cribs[:, k]] for k in range(4))
+            scores = scoreTable[cribRows].astype(np.float64)
+            # Starters in the crib are marked with NO_SCORE
+            starters = scores != NO_SCORE
+            means = np.where(starters, scores, 0).sum(axis=1) / starters.sum(axis=1)
+            cribTable[classes == throwClass, column] = np.average(means, weights=throwWeights[others])
+
+    if fileName is not None:
+        saveTable(fileName, cribTable)
+    return cribTable
+
+# Returns the two cards to throw from a six card hand
+def lookupThrow(hand, dealerFlag):
+    keys, table = getDiscardTable()
+    key, order = canonicalize(hand)
+    index = int(np.searchsorted(keys, np.uint64(key)))
+    canonical = decodeKeys([key])[0]
+    throw = canonical[THROWS[table[index, DEALER if dealerFlag else PONE]]]
+    return [CARDS[13 * order[cardId // 13] + cardId % 13] for cardId in throw]
+
+if __name__ == '__main__':
+    prebuildTables()
+    print("Saved the best throws for {} canonical hands".format(len(getDiscardTable()[0])))
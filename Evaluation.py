@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+################################################################################
+#
+# File : Evaluation.py
+# Authors : Kjartan, Tristan
+#
+# Description : Measures how much better one player is than another from as
+#               few hands as possible, with confidence intervals.
+#
+# Notes : Three things reduce the variance of the estimates:
+#           - Every player is evaluated on the same corpus of deals (two six
+#             card hands and a starter), generated once from a seed and
+#             optionally saved, so comparisons between players are paired
+#             deal by deal.
+#           - Arena plays each deal twice with the players swapping seats, so
+#             the luck of which cards were dealt cancels within a deal.
+#           - The luck of the starter is a control variate. For the cards each
+#             player actually kept, and the crib, the score with the real
+#             starter less the expected score over the 40 cards that could have
+#             been cut (from the hand score table in Scoring.py) has a known
+#             mean of zero. So does the dealer's 2 for his heels less its
+#             expectation. Their difference between the seats is regressed out
+#             of every metric.
+#
+#         Results are kept per deal (the mean of its two play throughs) from
+#         the first player's side, so pegging, hands and total are point
+#         differentials per hand. Confidence intervals use the normal
+#         approximation, which is accurate for the hundreds of deals or more
+#         that an evaluation needs.
+#
+#         Usage:
+#           python Evaluation.py [--candidates AI DiscardTable] [--opponent Myrmidon]
+#                                [--deals 2000] [--corpus deals.npy] [--workers 4] [--seed 1]
+#
+# Dependencies:
+#    - Arena.py (in local project)
+#    - DiscardTable.py (in local project)
+#    - Scoring.py (in local project)
+#    - Tournament.py (in local project)
+#    - numpy (third party library)
+#    - argparse, contextlib, math, os, statistics (standard python library)
+#
+################################################################################
+
+# Cribbage imports
+from Arena import Arena
+from DiscardTable import prebuildTables
+from Scoring import getScoreTable
+from Tournament import PLAYERS
+
+# Utility imports
+import numpy as np
+import argparse
+import contextlib
+from math import comb
+import os
+from statistics import NormalDist
+
+METRICS = ('pegging', 'hands', 'total')
+
+# Rank of every sorted four card hand in the hand score table
+_BINOMIALS = np.array([[comb(n, k) for n in range(52)] for k in range(5)], dtype=np.int64)
+JACKS = np.arange(10, 52, 13)
+
+# A corpus of numDeals deals, each 13 card ids: the first hand, the second hand
+# and the starter
+def makeDealCorpus(numDeals, seed=None):
+    RNG = np.random.default_rng(seed)
+    return np.argsort(RNG.random((numDeals, 52)), axis=1)[:, :13].astype(np.uint8)
+
+def saveDealCorpus(deals, fileName):
+    np.save(fileName, np.asarray(deals, dtype=np.uint8))
+
+def loadDealCorpus(fileName):
+    return np.load(fileName, mmap_mode='r')
+
+# The luck of the starter in each play through, from the first seat's side:
+# the difference between what the kept hands, the crib and his heels scored
+# and what they would score on average over the starters that could have been
+# cut. deals are the corpus and records the play throughs of it, in order.
+def starterLuck(deals, records):
+    deals = np.asarray(deals, dtype=np.int64)
+    dealers = np.array([record['dealer'] for record in records])
+    dealRows = np.array([record['hand'] for record in records]) - records[0]['hand']
+    throws = np.array([record['throws'] for record in records], dtype=np.int64)
+    starters = np.array([record['starter'] for record in records])
+    rows = np.arange(len(records))
+
+    # The first seat holds the first hand when it deals
+    firstHands = np.where(dealers[:, np.newaxis] == 0, deals[dealRows, 0:6], deals[dealRows, 6:12])
+    secondHands = np.where(dealers[:, np.newaxis] == 0, deals[dealRows, 6:12], deals[dealRows, 0:6])
+    unseen = np.ones((len(records), 52), dtype=bool)
+    unseen[rows[:, np.newaxis], deals[dealRows, 0:12]] = False
+
+    def luck(cards):
+        cards = np.sort(cards, axis=1)
+        tableRows = sum(_BINOMIALS[k + 1][cards[:, k]] for k in range(4))
+        scores = getScoreTable()[tableRows].astype(np.float64)
+        expected = (scores * unseen).sum(axis=1) / unseen.sum(axis=1)
+        return scores[rows, starters] - expected
+
+    def kept(hands, thrown):
+        return hands[~(hands[:, :, np.newaxis] == thrown[:, np.newaxis, :]).any(axis=2)].reshape(-1, 4)
+
+    dealerSign = np.where(dealers == 0, 1.0, -1.0)
+    heels = 2 * (np.isin(starters, JACKS) - unseen[:, JACKS].sum(axis=1) / unseen.sum(axis=1))
+    return (luck(kept(firstHands, throws[:, 0:2])) - luck(kept(secondHands, throws[:, 2:4])) +
+            dealerSign * (luck(throws) + heels))
+
+# Plays the two players (the first is the one evaluated) on every deal of the
+# corpus. Returns per deal arrays of each metric and of the starter luck.
+def evaluate(players, deals, seed=0, numWorkers=1):
+    prebuildTables()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        records = Arena(players, False, False).playDeals(deals, numWorkers, seed)
+    results = {metric: np.array([record[metric] for record in records], dtype=np.float64).reshape(-1, 2).mean(axis=1)
+               for metric in METRICS}
+    results['luck'] = starterLuck(deals, records).reshape(-1, 2).mean(axis=1)
+    return results
+
+# Mean and half width of the confidence interval of an array of samples
+def interval(samples, confidence=0.95):
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    return np.mean(samples), z * np.std(samples, ddof=1) / np.sqrt(len(samples))
+
+# Removes the part of samples explained by the zero mean control variate
+def controlled(samples, control):
+    variance = np.var(control, ddof=1)
+    if variance == 0:
+        return samples
+    beta = np.cov(samples, control)[0, 1] / variance
+    return samples - beta * control
+
+# Summarizes each metric of a result: the plain mean and interval, the mean
+# and interval with the control variate, and the factor by which the control
+# variate cut the variance (how many times more deals the plain mean would
+# need for the same interval)
+def summarize(results, confidence=0.95):
+    summary = {'deals': len(results['luck'])}
+    for metric in METRICS:
+        samples = results[metric]
+        adjusted = controlled(samples, results['luck'])
+        mean, halfWidth = interval(samples, confidence)
+        adjustedMean, adjustedHalfWidth = interval(adjusted, confidence)
+        summary[metric] = {'mean': mean, 'halfWidth': halfWidth, 'adjustedMean': adjustedMean,
+                           'adjustedHalfWidth': adjustedHalfWidth,
+                           'varianceReduction': np.var(samples) / np.var(adjusted) if np.var(adjusted) else 1.0}
+    return summary
+
+# The difference between two results on the same corpus (against the same
+# opponent), deal by deal
+def compare(first, second, confidence=0.95):
+    return summarize({key: first[key] - second[key] for key in first}, confidence)
+
+def report(name, summary):
+    print("{} over {} deals:".format(name, summary['deals']))
+    for metric in METRICS:
+        stats = summary[metric]
+        print("  {:8} {:+8.3f} +/- {:6.3f}   with control variate {:+8.3f} +/- {:6.3f}   (variance / {:.2f})".format(
+            metric, stats['mean'], stats['halfWidth'], stats['adjustedMean'], stats['adjustedHalfWidth'],
+            stats['varianceReduction']))
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Variance reduced evaluation of cribbage players")
+    parser.add_argument('--candidates', nargs='+', choices=sorted(PLAYERS), default=['AI', 'DiscardTable'])
+    parser.add_argument('--opponent', choices=sorted(PLAYERS), default='Myrmidon')
+    parser.add_argument('--deals', type=int, default=2000)
+    parser.add_argument('--corpus', help="deal corpus to load, or to save if it doesn't exist yet")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--confidence', type=float, default=0.95)
+    arguments = parser.parse_args(arguments)
+
+    if arguments.corpus is not None and os.path.exists(arguments.corpus):
+        deals = loadDealCorpus(arguments.corpus)
+    else:
+        deals = makeDealCorpus(arguments.deals, arguments.seed)
+        if arguments.corpus is not None:
+            saveDealCorpus(deals, arguments.corpus)
+
+    results = {}
+    for name in arguments.candidates:
+        players = [PLAYERS[name](1), PLAYERS[arguments.opponent](2)]
+        results[name] = evaluate(players, deals, arguments.seed, arguments.workers)
+        report("{} against {}".format(name, arguments.opponent), summarize(results[name], arguments.confidence))
+    for i, first in enumerate(arguments.candidates):
+        for second in arguments.candidates[i + 1:]:
+            report("{} less {}".format(first, second),
+                   compare(results[first], results[second], arguments.confidence))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+################################################################################
+#
+# File : FeatureEncoder.py
+# Authors : Kjartan, Tristan
+#
+# Description : Turns pegging states, and the plays that can be made from them,
+#               into fixed-width rows of features for learning players.
+#
+# Notes : States are encoded from the fixed-width records of ReplayBuffer.py,
+#         so a whole batch (a minibatch sampled from a replay buffer, say) is
+#         encoded with a few NumPy operations and no Python loop over states
+#         or cards. A single game state is first written into a record (see
+#         ReplayBuffer.stateFields) and then encoded the same way.
+#
+#         Each state row holds, from the deciding player's side:
+#           - HAND: one-hot planes of 52 card ids for the cards in hand,
+#           - PLAYED: the cards played so far this hand,
+#           - COUNTING: the cards in the current count,
+#           - STARTER: the starter,
+#           - LAST_RANKS: the ranks of the last and second last cards in the
+#             current count (13 each), which decide pairs and runs,
+#           - COUNT, SCORES (own, opponent), NUM_CARDS (own, opponent) and
+#             DEALER.
+#         Candidate rows are a state row followed by ACTION, a one-hot plane of
+#         the card played, with the last column for a go.
+#
+#         With a floating point dtype the count, scores and card counts are
+#         scaled to about [0, 1]; with an integer dtype (uint8) they are kept
+#         as they are, with scores capped at 255.
+#
+#         Rows are written into arrays the encoder allocates once and grows
+#         only when a larger batch comes along. The arrays returned are views
+#         of them, so they are overwritten by the encoder's next call; copy
+#         them to keep them.
+#
+# Dependencies:
+#    - Deck.py (in local project)
+#    - ReplayBuffer.py (in local project)
+#    - numpy (third party library)
+#
+################################################################################
+
+# Cribbage imports
+from Deck import CARDS, CARD_VALUES
+from ReplayBuffer import RECORD_DTYPE, NO_CARD, stateFields
+
+# Utility imports
+import numpy as np
+
+# Column offsets of the features in a row
+HAND = 0
+PLAYED = HAND + 52
+COUNTING = PLAYED + 52
+STARTER = COUNTING + 52
+LAST_RANKS = STARTER + 52
+COUNT = LAST_RANKS + 26
+SCORES = COUNT + 1
+NUM_CARDS = SCORES + 2
+DEALER = NUM_CARDS + 2
+STATE_WIDTH = DEALER + 1
+ACTION = STATE_WIDTH
+CANDIDATE_WIDTH = ACTION + 53
+
+# Count values indexed by card id, with NO_CARD worth nothing
+_VALUES = np.append(CARD_VALUES, 0).astype(np.int16)
+
+class FeatureEncoder:
+    def __init__(self, capacity=1024, dtype=np.float32):
+        self.dtype = np.dtype(dtype)
+        self.scaled = np.issubdtype(self.dtype, np.floating)
+        self.states = np.zeros((capacity, STATE_WIDTH), dtype=self.dtype)
+        self.candidates = np.zeros((4 * capacity, CANDIDATE_WIDTH), dtype=self.dtype)
+        self.record = np.zeros(1, dtype=RECORD_DTYPE)
+
+    # Grows an array to hold at least rows rows, and returns the first rows
+    def rows(self, name, rows):
+        array = getattr(self, name)
+        if len(array) < rows:
+            array = np.zeros((max(rows, 2 * len(array)), array.shape[1]), dtype=self.dtype)
+            setattr(self, name, array)
+        return array[:rows]
+
+    # Sets a one-hot column for each card id (an (N, k) array) that isn't
+    # NO_CARD
+    @staticmethod
+    def oneHot(out, ids, offset):
+        rows, slots = np.nonzero(ids != NO_CARD)
+        out[rows, offset + ids[rows, slots]] = 1
+
+    # Writes the state features of records into out, an (N, >= STATE_WIDTH)
+    # array
+    def fillStates(self, records, out):
+        out[:] = 0
+        rows = np.arange(len(records))
+        playorder = records['playorder'].astype(np.int64)
+        inplay = records['inplay'].astype(np.int64)
+        numPlayed = (playorder != NO_CARD).sum(axis=1)
+        positions = np.arange(playorder.shape[1])
+        counting = (positions >= (numPlayed - inplay)[:, np.newaxis]) & (positions < numPlayed[:, np.newaxis])
+
+        self.oneHot(out, records['hand'].astype(np.int64), HAND)
+        self.oneHot(out, playorder, PLAYED)
+        self.oneHot(out, np.where(counting, playorder, NO_CARD), COUNTING)
+        self.oneHot(out, records['starter'][:, np.newaxis].astype(np.int64), STARTER)
+        for back in (1, 2):
+            cards = playorder[rows, np.maximum(numPlayed - back, 0)]
+            present = inplay >= back
+            out[rows[present], LAST_RANKS + 13 * (back - 1) + cards[present] % 13] = 1
+
+        if self.scaled:
+            out[:, COUNT] = records['count'] / 31
+            out[:, SCORES:SCORES + 2] = records['scores'] / 121
+            out[:, NUM_CARDS:NUM_CARDS + 2] = records['numCards'] / 4
+        else:
+            out[:, COUNT] = records['count']
+            out[:, SCORES:SCORES + 2] = np.minimum(records['scores'], 255)
+            out[:, NUM_CARDS:NUM_CARDS + 2] = records['numCards']
+        out[:, DEALER] = records['dealer']
+        return out
+
+    # Encodes a batch of records (RECORD_DTYPE) as an (N, STATE_WIDTH) array
+    def encodeRecords(self, records):
+        return self.fillStates(records, self.rows('states', len(records)))
+
+    # Encodes a batch of records with the action each one took, as an
+    # (N, CANDIDATE_WIDTH) array, e.g. for fitting action values
+    def encodeActions(self, records):
+        out = self.rows('candidates', len(records))
+        self.fillStates(records, out)
+        out[np.arange(len(records)), ACTION + records['action'].astype(np.int64)] = 1
+        return out
+
+    # Encodes every legal play from each of a batch of records: the cards in
+    # hand that keep the count at 31 or less, or a go if there are none.
+    # Returns the (M, CANDIDATE_WIDTH) rows, the index of the record each row
+    # is for, and the card id each row plays (NO_CARD for a go).
+    def encodeCandidates(self, records):
+        hands = records['hand'].astype(np.int64)
+        legal = (hands != NO_CARD) & (records['count'][:, np.newaxis] + _VALUES[hands] <= 31)
+        options = np.concatenate([legal, ~legal.any(axis=1, keepdims=True)], axis=1)
+        recordRows, slots = np.nonzero(options)
+        actions = np.where(slots == 4, NO_CARD, hands[recordRows, np.minimum(slots, 3)])
+
+        states = self.encodeRecords(records)
+        out = self.rows('candidates', len(recordRows))
+        out[:, :STATE_WIDTH] = states[recordRows]
+        out[:, ACTION:] = 0
+        out[np.arange(len(recordRows)), ACTION + actions] = 1
+        return out, recordRows, actions
+
+    # Writes a game state, for the player with the given number holding hand,
+    # into the encoder's single record
+    def fillRecord(self, gameState, hand, number):
+        fields = stateFields(gameState, hand, number - 1)
+        for name, value in zip(('hand', 'playorder', 'inplay', 'starter', 'count', 'scores', 'numCards', 'dealer'),
+                               fields):
+            self.record[name] = value
+        return self.record
+
+    # Encodes one game state as a (1, STATE_WIDTH) array
+    def encodeState(self, gameState, hand, number):
+        return self.encodeRecords(self.fillRecord(gameState, hand, number))
+
+    # Encodes the legal plays from one game state. Returns the rows and the
+    # card each one plays (None for a go).
+    def encodeStateCandidates(self, gameState, hand, number):
+        out, recordRows, actions = self.encodeCandidates(self.fillRecord(gameState, hand, number))
+        return out, [None if action == NO_CARD else CARDS[action] for action in actions]
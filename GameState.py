@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+################################################################################
+#
+# File : GameState.py
+# Authors : Kjartan, Tristan
+#
+# Description : The state of a game of cribbage as seen by the players. The
+#               Cribbage engine owns a single GameState and updates it as the
+#               game goes, instead of building a new dictionary every time a
+#               player needs to see the state.
+#
+# Notes : Every field a player can see is an int or a tuple, so players can't
+#         change the game by modifying the state they are given. Only the
+#         engine should call the update methods.
+#
+#         For compatibility with players written against the old dictionary
+#         state, fields can also be read as gameState['count'] and so on.
+#
+#         pegging is a read-only view (Scoring.PeggingView) of the engine's
+#         PeggingSequence for the current count. Players can score candidate
+#         plays with it, or copy it to play cards on their own sequence.
+#
+# Dependencies:
+#    - Scoring.py (in local project)
+#
+################################################################################
+
+from Scoring import PeggingSequence, PeggingView
+
+class GameState:
+    # The fields players can see
+    FIELDS = ('scores', 'numCards', 'inplay', 'playorder', 'dealer', 'starter', 'count', 'pegging')
+    __slots__ = FIELDS + ('_sequence',)
+
+    def __init__(self, numPlayers, dealer=0):
+        self.scores = (0,) * numPlayers
+        self.numCards = (0,) * numPlayers
+        self.inplay = ()
+        self.playorder = ()
+        self.dealer = dealer
+        self.starter = None
+        self.count = 0
+        # The engine plays on _sequence; players only see it through pegging
+        self._sequence = PeggingSequence()
+        self.pegging = PeggingView(self._sequence)
+
+    # Dictionary style access to the fields
+    def __getitem__(self, key):
+        if key not in GameState.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in GameState.FIELDS
+
+    def get(self, key, default=None):
+        if key not in GameState.FIELDS:
+            return default
+        return getattr(self, key)
+
+    def keys(self):
+        return GameState.FIELDS
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in GameState.FIELDS]
+
+    # Returns a plain dictionary copy of the state, e.g. to keep a snapshot
+    def asDict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return "GameState({})".format(", ".join("{}={}".format(key, value) for key, value in self.items()))
+
+    # The following methods are used by the engine to keep the state current
+    def updateScores(self, players):
+        self.scores = tuple([player.pips for player in players])
+
+    def updateNumCards(self, players):
+        self.numCards = tuple([len(player.playhand) for player in players])
+
+    # A card has been played during pegging. Returns the points it scored.
+    def addPlay(self, card, verbose=False):
+        self.inplay = self.inplay + (card,)
+        self.playorder = self.playorder + (card,)
+        self.count += card.value()
+        return self._sequence.play(card, verbose)
+
+    # The count has been reset after a go or 31
+    def newCount(self):
+        self.inplay = ()
+        self.count = 0
+        self._sequence.reset()
+
+    # A new hand is starting
+    def newHand(self):
+        self.inplay = ()
+        self.playorder = ()
+        self.starter = None
+        self.count = 0
+        self._sequence.reset()
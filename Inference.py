@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+################################################################################
+#
+# File : Inference.py
+# Authors : Kjartan, Tristan
+#
+# Description : Keeps a posterior over the cards the opponent still holds during
+#               pegging, so players can reason about what it is likely to play.
+#
+# Notes : The posterior is an array of every hand the opponent could hold (one
+#         row of card ids per hand) with a weight for each. It starts uniform
+#         over the cards the player hasn't seen. When the opponent plays a card,
+#         hands without it are dropped and the card is replaced by the sentinel
+#         id 52 in the rest. When it says go, hands holding a card that fits
+#         under 31 are dropped. Each update is a single pass over the remaining
+#         hands.
+#
+#         The opponent is assumed to be equally likely to play any of its cards,
+#         so a play only tells us that it held the card.
+#
+#         A go can only be seen by the player on its next turn, while the count
+#         it was said at is still in play. A go followed by a second go ends the
+#         count before the player sees it, so that go is not observed.
+#
+# Dependencies:
+#    - Deck.py (in local project)
+#    - numpy (third party library)
+#    - itertools (standard python library)
+#
+################################################################################
+
+# Cribbage imports
+from Deck import CARDS, CARD_VALUES
+
+# Utility imports
+import numpy as np
+from itertools import chain, combinations
+
+# Stands in for a card the opponent has already played
+PLAYED = 52
+
+# Count value of each card id, with the played sentinel too large to ever play
+_VALUES = np.append(CARD_VALUES.astype(np.int16), 99)
+
+_combinationCache = {}
+
+# Returns every combination of k of the indices 0..n-1, one per row
+def _combinationIndices(n, k):
+    key = (n, k)
+    indices = _combinationCache.get(key)
+    if indices is None:
+        indices = np.fromiter(chain.from_iterable(combinations(range(n), k)), dtype=np.int8)
+        indices = indices.reshape(-1, k)
+        indices.flags.writeable = False
+        _combinationCache[key] = indices
+    return indices
+
+class OpponentHandPosterior:
+    def __init__(self, unseenCards, handSize=4, weights=None):
+        unseen = np.array(sorted(card.id for card in unseenCards), dtype=np.int8)
+        self.hands = unseen[_combinationIndices(len(unseen), handSize)]
+        if weights is None:
+            weights = np.ones(len(self.hands))
+        self.weights = np.asarray(weights, dtype=np.float64)
+
+    # Starts from everything that isn't in seenCards (our own six cards and
+    # the starter, usually)
+    @classmethod
+    def fromSeen(cls, seenCards, handSize=4):
+        seen = set(seenCards)
+        return cls([card for card in CARDS if card not in seen], handSize)
+
+    def __len__(self):
+        return len(self.hands)
+
+    # Drops the hands that can no longer be held
+    def _keep(self, possible):
+        self.hands = self.hands[possible]
+        self.weights = self.weights[possible]
+        if len(self.hands) == 0:
+            raise ValueError("No hand the opponent could hold is consistent with what has been seen")
+
+    # The opponent played card
+    def observePlay(self, card):
+        held = self.hands == card.id
+        possible = held.any(axis=1)
+        self._keep(possible)
+        self.hands[held[possible]] = PLAYED
+
+    # The opponent said go with the count at count
+    def observeGo(self, count):
+        self._keep(~(_VALUES[self.hands] <= 31 - count).any(axis=1))
+
+    # The cards were seen somewhere other than the opponent's hand
+    def observeCards(self, cards):
+        ids = [card.id for card in cards]
+        self._keep(~np.isin(self.hands, ids).any(axis=1))
+
+    # Brings the posterior up to date with the game state, given the cards the
+    # player owns. Call it on each of the player's turns during pegging.
+    def observeState(self, gameState, ownCards, observed=0):
+        own = set(ownCards)
+        playorder = gameState['playorder']
+        for card in playorder[observed:]:
+            if card not in own:
+                self.observePlay(card)
+        # If the last card in the count was ours, the opponent said go
+        if len(gameState['inplay']) > 0 and playorder[-1] in own:
+            self.observeGo(gameState['count'])
+        return len(playorder)
+
+    # Probability that the opponent still holds each card, indexed by card id
+    def marginals(self):
+        total = self.weights.sum()
+        held = np.zeros(PLAYED + 1)
+        np.add.at(held, self.hands, self.weights[:, np.newaxis])
+        return held[:PLAYED] / total
+
+    # Probability that the opponent holds at least one card for which
+    # responses (indexed by card id, plus the sentinel) is True
+    def probability(self, responses):
+        responses = np.append(np.asarray(responses, dtype=bool)[:PLAYED], False)
+        able = responses[self.hands].any(axis=1)
+        return float(self.weights[able].sum() / self.weights.sum())
+
+    # Probabilities that the opponent can make fifteen, thirty-one, a pair or a
+    # run with its next card if we play candidate onto pegging (the current
+    # PeggingSequence)
+    def responseProbabilities(self, pegging, candidate):
+        sequence = pegging.copy()
+        sequence.play(candidate)
+        probabilities = {'fifteen': 0.0, 'thirtyOne': 0.0, 'pair': 0.0, 'run': 0.0}
+        if sequence.count == 31:
+            # The count starts again, so nothing can be made off the candidate
+            return probabilities
+
+        responses = {key: np.zeros(PLAYED, dtype=bool) for key in probabilities}
+        for card in CARDS:
+            if not sequence.canPlay(card):
+                continue
+            countPips, pairPips, runPips = sequence.scoreParts(card)
+            count = sequence.count + card.pips
+            responses['fifteen'][card.id] = count == 15
+            responses['thirtyOne'][card.id] = count == 31
+            responses['pair'][card.id] = pairPips > 0
+            responses['run'][card.id] = runPips > 0
+
+        for key in probabilities:
+            probabilities[key] = self.probability(responses[key])
+        return probabilities
+
+    # Probability that the opponent scores anything with its next card if we
+    # play candidate onto pegging
+    def scoringProbability(self, pegging, candidate):
+        sequence = pegging.copy()
+        sequence.play(candidate)
+        if sequence.count == 31:
+            return 0.0
+        responses = [sequence.canPlay(card) and sequence.score(card) > 0 for card in CARDS]
+        return self.probability(responses)
+
+    # Probability that the opponent will have to say go if we play candidate
+    def goProbability(self, count, candidate):
+        count += candidate.pips
+        return 1.0 - self.probability(_VALUES[:PLAYED] <= 31 - count)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+
+################################################################################
+#
+# File : Instrumentation.py
+# Authors : Kjartan, Tristan
+#
+# Description : Opt-in timing of the Cribbage engine's phases and of each
+#               player's decisions, and counts of calls to the scoring
+#               functions.
+#
+# Notes : Nothing is measured unless an Instrumentation is attached. Attaching
+#         replaces the engine's phase methods and the players' methods with
+#         timed versions on the instances themselves, and the scoring functions
+#         with counting versions in every module that imported them. Detaching
+#         puts the originals back, so there is no overhead when instrumentation
+#         isn't in use.
+#
+#         Phases are nested (play includes the players' playCard calls), so
+#         their times shouldn't be added together.
+#
+#         Latencies are kept in histograms with logarithmic buckets, eight to
+#         each doubling, so percentiles are accurate to about 9%.
+#
+#         Instrumented players can't be sent to other processes, so instrumented
+#         Arena runs must be played with a single worker.
+#
+# Dependencies:
+#    - Scoring.py (in local project)
+#    - functools (standard python library)
+#    - json (standard python library)
+#    - math (standard python library)
+#    - sys (standard python library)
+#    - time (standard python library)
+#
+################################################################################
+
+# Cribbage imports
+import Scoring
+
+# Utility imports
+from functools import wraps
+import json
+import math
+import sys
+import time
+
+# The engine methods and player methods that are timed
+PHASES = ('deal', 'createCrib', 'cut', 'play', 'scoreHands', 'restoreDeck', 'resetGame')
+PLAYER_METHODS = ('throwCribCards', 'playCard', 'learnFromHandScores', 'learnFromPegging')
+
+# The scoring functions whose calls are counted
+SCORING_FUNCTIONS = ('getScore', 'getScoreNoStarter', 'lookupScore', 'scoreBreakdown', 'getScoreBatch',
+                     'scoreHandArrays', 'getStarterScores', 'scoreCards')
+PEGGING_METHODS = ('play', 'score')
+
+class LatencyHistogram:
+    BUCKETS_PER_DOUBLING = 8
+    # Bucket 0 holds everything faster than MINIMUM seconds
+    MINIMUM = 1e-7
+    NUM_BUCKETS = 8 * 40 + 1
+
+    def __init__(self):
+        self.buckets = [0] * LatencyHistogram.NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+        if seconds < LatencyHistogram.MINIMUM:
+            self.buckets[0] += 1
+        else:
+            bucket = int(math.log2(seconds / LatencyHistogram.MINIMUM) * LatencyHistogram.BUCKETS_PER_DOUBLING) + 1
+            self.buckets[min(bucket, LatencyHistogram.NUM_BUCKETS - 1)] += 1
+
+    # The upper edge of the bucket holding the qth quantile (0 <= q <= 1)
+    def percentile(self, q):
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target and count > 0:
+                edge = LatencyHistogram.MINIMUM * 2 ** (bucket / LatencyHistogram.BUCKETS_PER_DOUBLING)
+                return min(edge, self.maximum)
+        return self.maximum
+
+    def summary(self):
+        return {'count': self.count, 'total': self.total, 'mean': self.total / self.count if self.count else 0.0,
+                'p50': self.percentile(0.5), 'p95': self.percentile(0.95), 'p99': self.percentile(0.99),
+                'max': self.maximum}
+
+# Returns a version of method that records how long each call takes
+def timed(method, histogram):
+    clock = time.perf_counter
+
+    @wraps(method)
+    def timedMethod(*args, **kwargs):
+        start = clock()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            histogram.record(clock() - start)
+    return timedMethod
+
+class Instrumentation:
+    def __init__(self, outputFile=None):
+        self.outputFile = outputFile
+        self.histograms = {}
+        self.calls = {}
+        # (object, attribute name, original value or None if it was inherited)
+        self.patches = []
+
+    def histogram(self, name):
+        if name not in self.histograms:
+            self.histograms[name] = LatencyHistogram()
+        return self.histograms[name]
+
+    def patch(self, target, name, replacement):
+        original = target.__dict__.get(name) if hasattr(target, '__dict__') else None
+        self.patches.append((target, name, original))
+        setattr(target, name, replacement)
+
+    # Times the engine's phases and its players' decisions
+    def attachEngine(self, cribbage):
+        for phase in PHASES:
+            self.patch(cribbage, phase, timed(getattr(cribbage, phase), self.histogram('phase.' + phase)))
+        for player in cribbage.players:
+            self.attachPlayer(player)
+
+    def attachPlayer(self, player):
+        for method in PLAYER_METHODS:
+            name = "player.{}.{}".format(player.getName(), method)
+            self.patch(player, method, timed(getattr(player, method), self.histogram(name)))
+
+    # Counts calls to the scoring functions, wherever they are called from
+    def attachScoring(self):
+        for name in SCORING_FUNCTIONS:
+            original = getattr(Scoring, name)
+            counted = self.counted(original, 'scoring.' + name)
+            for module in list(sys.modules.values()):
+                if getattr(module, name, None) is original:
+                    self.patch(module, name, counted)
+        for name in PEGGING_METHODS:
+            original = getattr(Scoring.PeggingSequence, name)
+            self.patch(Scoring.PeggingSequence, name, self.counted(original, 'scoring.PeggingSequence.' + name))
+
+    def counted(self, function, name):
+        self.calls.setdefault(name, 0)
+        calls = self.calls
+
+        @wraps(function)
+        def countedFunction(*args, **kwargs):
+            calls[name] += 1
+            return function(*args, **kwargs)
+        return countedFunction
+
+    def attach(self, cribbage):
+        self.attachEngine(cribbage)
+        self.attachScoring()
+        return self
+
+    # Also times each play through of a hand in an Arena
+    def attachArena(self, arena):
+        self.attach(arena.cribbageDojo)
+        self.patch(arena, 'playThrough', timed(arena.playThrough, self.histogram('arena.playThrough')))
+        return self
+
+    # Puts back everything that was replaced, newest first
+    def detach(self):
+        for target, name, original in reversed(self.patches):
+            if original is None:
+                delattr(target, name)
+            else:
+                setattr(target, name, original)
+        self.patches = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.detach()
+        return False
+
+    def summary(self):
+        return {'latency': {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+                'calls': dict(sorted(self.calls.items()))}
+
+    def report(self):
+        print("{:45} {:>8} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+            "Timed", "Calls", "Total s", "p50 ms", "p95 ms", "p99 ms", "Max ms"))
+        for name, stats in self.summary()['latency'].items():
+            print("{:45} {:>8} {:>10.3f} {:>10.4f} {:>10.4f} {:>10.4f} {:>10.4f}".format(
+                name, stats['count'], stats['total'], 1000 * stats['p50'], 1000 * stats['p95'],
+                1000 * stats['p99'], 1000 * stats['max']))
+        print("{:45} {:>8}".format("Scoring function", "Calls"))
+        for name, count in self.calls.items():
+            print("{:45} {:>8}".format(name, count))
+
+    def save(self, fileName):
+        with open(fileName, 'w') as file:
+            json.dump(self.summary(), file, indent=2)
+
+    # Exports the summary at the end of a run
+    def finish(self):
+        self.report()
+        if self.outputFile is not None:
+            self.save(self.outputFile)
@@ -16,17 +16,16 @@
 #    - Scoring.py (in local project)
 #    - Arena.py (in local project)           * - for __name__ = '__main__' only
 #    - Player.py (in local project)
-#    - numpy (standard python library)
+#    - numpy (third party library)
 #    - itertools (standard python library)
-#    - random (standard python library)
 #    - matplotlib (standard python library)  * - for __name__ = '__main__' only
 #
 ################################################################################
 
 # Cribbage imports
 from Utilities import cardsString
-from Deck import Card
-from Scoring import scoreCards, getScore
+from Deck import CARDS, cardsToIds, cardsToMask, isInMask
+from Scoring import PeggingSequence, getScore, starterScoreRow
 from Arena import Arena
 
 # Player imports
@@ -35,19 +34,23 @@ from Player import Player
 # Utility imports
 import numpy as np
 from itertools import combinations
-import random
 import matplotlib.pyplot as plt
 
 class Myrmidon(Player):
 
-    def __init__(self, number, numSims,verboseFlag):
+    def __init__(self, number, numSims,verboseFlag,exact=False):
         super().__init__(number)
         self.numSims = max(numSims,1)
         self.verbose = verboseFlag
+        # If exact is set, every unseen starter is considered instead of
+        # sampling numSims of them
+        self.exact = exact
         self.name = "Myrmidon"
         self.cribThrow = []
-        self.throwString = ""
-        self.playString = ""
+        # The reasons behind the last throw and play, kept as plain data and
+        # only formatted if explainThrow or explainPlay is called
+        self.throwReasons = None
+        self.playReasons = None
 
     def reset(self, gameState=None):
         super().reset()
@@ -55,19 +58,35 @@ class Myrmidon(Player):
     # If the argument card is in the argument set of cards, return true.
     # Otherwise return false.
     def inHand(self, cardToCheck):
-        return cardToCheck in self.hand
+        return isInMask(cardToCheck, cardsToMask(self.hand))
 
-    # Returns a random starter card that isn't in the player's hand
-    def randomStarter(self):
-        newCard = Card(random.randint(1, 13), random.randint(1, 4))
+    # Returns a random starter card that isn't in the player's hand. The hand
+    # can be passed in as a mask to avoid rebuilding it for every starter.
+    def randomStarter(self, handMask=None):
+        if handMask is None:
+            handMask = cardsToMask(self.hand)
+        cardId = self.RNG.randrange(52)
 
-        while newCard in self.hand:
-            newCard = Card(random.randint(1, 13), random.randint(1, 4))
+        while (handMask >> cardId) & 1:
+            cardId = self.RNG.randrange(52)
 
-        return newCard
+        return CARDS[cardId]
+
+    # Returns the total score of a combination of cards over numSims sampled
+    # starters or, in exact mode, over every starter that isn't in the player's
+    # hand.
+    def simulateScore(self, combination, handMask, unseen):
+        if self.exact:
+            return int(starterScoreRow(sorted(card.id for card in combination))[unseen].sum())
+        score = 0
+        for i in range(0, self.numSims):
+            starterCard = self.randomStarter(handMask)
+            score += getScore(list(combination), starterCard, False)
+        return score
 
     # Chooses which cards to throw based on randomly sampling potential starter
-    # cards for each combination of cards thrown.
+    # cards (or using all of them in exact mode) for each combination
+    # of cards thrown.
     def throwCribCards(self, numCards, gameState):
         cribCards = []
         cardScores = np.zeros(len(self.hand))
@@ -75,42 +94,37 @@ class Myrmidon(Player):
             dealerFlag = True
         else:
             dealerFlag = False 
-            
-        self.throwString = "Myrmidon ({}) is considering a hand of: {}".format(self.number,cardsString(self.hand))
-        if dealerFlag:
-            self.throwString = "{}. Own crib.\n".format(self.throwString)
-        else:
-            self.throwString = "{}. Opponent's crib.\n".format(self.throwString)
-            
+
+        hand = tuple(self.hand)
+        handMask = cardsToMask(self.hand)
+        unseen = np.ones(52, dtype=bool)
+        unseen[cardsToIds(self.hand)] = False
+        numStarters = 52 - len(self.hand) if self.exact else self.numSims
+
         # Score the cards that would be left in the player's hand
         for combination in combinations(self.hand, len(self.hand) - numCards):
-            for i in range(0, self.numSims):
-                starterCard = self.randomStarter()
-                score = getScore(list(combination), starterCard, False)
-                for j in range(0, len(self.hand)):
-                    if self.hand[j] in combination:
-                        cardScores[j] += score
+            score = self.simulateScore(combination, handMask, unseen)
+            for j in range(0, len(self.hand)):
+                if self.hand[j] in combination:
+                    cardScores[j] += score
 
         # Score the cards that would be thrown in the crib
         for combination in combinations(self.hand, numCards):
-            for i in range(0, self.numSims):
-                starterCard = self.randomStarter()
-                score = getScore(list(combination), starterCard, False)
-                for j in range(0, len(self.hand)):
-                    if self.hand[j] in combination:
-                        if dealerFlag:
-                            # We can worry less about keeping the card if it
-                            # will score points for us in the crib
-                            cardScores[j] -= score
-                            if self.hand[j].rank == 5:
-                                cardScores[j] += 2
-                        else:
-                            # We should keep cards that will score points for 
-                            # our opponents in the crib
-                            cardScores[j] += score
-
-        for i in range(len(self.hand)):
-            self.throwString = "{}\t{}: {}\n".format(self.throwString,str(self.hand[i]),cardScores[i])
+            score = self.simulateScore(combination, handMask, unseen)
+            for j in range(0, len(self.hand)):
+                if self.hand[j] in combination:
+                    if dealerFlag:
+                        # We can worry less about keeping the card if it
+                        # will score points for us in the crib
+                        cardScores[j] -= score
+                        if self.hand[j].rankValue == 5:
+                            cardScores[j] += 2 * numStarters
+                    else:
+                        # We should keep cards that will score points for 
+                        # our opponents in the crib
+                        cardScores[j] += score
+
+        self.throwReasons = (hand, dealerFlag, cardScores, cribCards)
 
         # Pick the lowest scoring cards to throw
         for i in range(0, numCards):
@@ -118,8 +132,6 @@ class Myrmidon(Player):
             cribCards.append(self.hand.pop(lowIndex))
             cardScores = np.delete(cardScores, lowIndex)
 
-        self.throwString = "{}I chose to throw: {}\n\n".format(self.throwString, cardsString(cribCards))
-
         if(self.verbose):
             print("Myrmidon ({}) threw {} cards into the crib".format(self.number, numCards))
 
@@ -130,54 +142,90 @@ class Myrmidon(Player):
         return cribCards
 
     def explainThrow(self):
-        print(self.throwString)
+        if self.throwReasons is None:
+            return
+        hand, dealerFlag, cardScores, cribCards = self.throwReasons
+        throwString = "Myrmidon ({}) is considering a hand of: {}".format(self.number,cardsString(list(hand)))
+        if dealerFlag:
+            throwString = "{}. Own crib.\n".format(throwString)
+        else:
+            throwString = "{}. Opponent's crib.\n".format(throwString)
+        for i in range(len(hand)):
+            throwString = "{}\t{}: {}\n".format(throwString,str(hand[i]),cardScores[i])
+        throwString = "{}I chose to throw: {}\n\n".format(throwString, cardsString(cribCards))
+        print(throwString)
 
     # Chooses a card to play during pegging by maximizing the immediate return
     # and the value of the afterstate according to some heuristic rules.
     def playCard(self, gameState):
         cardScores = np.zeros(len(self.playhand))
         playedCard = None
-        countCards = gameState['inplay']
         count = gameState['count']
+        if 'pegging' in gameState:
+            pegging = gameState['pegging']
+        else:
+            pegging = PeggingSequence(gameState['inplay'])
+        # One entry per card: (card, score for its rank, count it was adjusted
+        # for, whether it was rewarded for a low count, final score)
+        candidates = []
+        self.playReasons = (candidates, None)
 
         if len(self.playhand) != 0:
-            self.playString = "\tMyrmidon ({}) is considering:\n".format(self.number)
             for i in range(0, len(self.playhand)):
-                self.playString = "{}\t{} ".format(self.playString,str(self.playhand[i]))
                 # Check that the card can be played
                 if count + self.playhand[i].value() < 32:
-                    newCountCards = countCards + [self.playhand[i]]
-                    cardScores[i] += 10 * scoreCards(newCountCards, False) + self.playhand[i].rank.value
-                    self.playString = "{}scores {} for its rank,".format(self.playString,cardScores[i])
+                    cardScores[i] += 10 * pegging.score(self.playhand[i]) + self.playhand[i].rankValue
+                    rankScore = cardScores[i]
+                    adjustedFor = None
                     if (count + self.playhand[i].value() == 5) or (count + self.playhand[i].value() == 10) or (
                             count + self.playhand[i].value() == 21):
                         cardScores[i] = max(1, cardScores[i] - 10)
-                        self.playString = "{0}is adjusted to {1} for the count left ({2}), ".format(self.playString,cardScores[i],(count + self.playhand[i].value()))
-                    if count + self.playhand[i].value() < 5:
+                        adjustedFor = count + self.playhand[i].value()
+                    rewarded = count + self.playhand[i].value() < 5
+                    if rewarded:
                         cardScores[i] += 15
-                        self.playString = "{}is rewarded for leaving a count of less than 5, ".format(self.playString)
-                    self.playString = "{} Final score is {}.\n".format(self.playString,cardScores[i])
+                    candidates.append((self.playhand[i], rankScore, adjustedFor, rewarded, cardScores[i]))
                 else:
-                    self.playString = "{}can't be played.\n".format(self.playString)
+                    candidates.append((self.playhand[i], None, None, False, None))
 
             if np.amax(cardScores) > 0:
                 playedCard = self.playhand.pop(max(range(len(cardScores)), key=cardScores.__getitem__))
-                self.playString = "{}\tI choose to play {}\n".format(self.playString,str(playedCard))
+                self.playReasons = (candidates, playedCard)
                 if(self.verbose):
                     print("\tMyrmidon ({}) played {}".format(self.number, str(playedCard)))
             else:
-                self.playString = "{}\tI can't play any of my cards and have to say go!\n".format(self.playString)
                 if(self.verbose):
                     print("\tMyrmidon ({}) says go!".format(self.number))
         else:
-            self.playString = "\tMyrmidon ({}): I have no cards left and have to say go!".format(self.number)
             if(self.verbose):
                 print("\tMyrmidon ({}) has no cards left; go!".format(self.number))
 
         return playedCard
 
     def explainPlay(self):
-       print(self.playString)
+        if self.playReasons is None:
+            return
+        candidates, playedCard = self.playReasons
+        if len(candidates) == 0:
+            print("\tMyrmidon ({}): I have no cards left and have to say go!".format(self.number))
+            return
+        playString = "\tMyrmidon ({}) is considering:\n".format(self.number)
+        for card, rankScore, adjustedFor, rewarded, finalScore in candidates:
+            playString = "{}\t{} ".format(playString,str(card))
+            if rankScore is None:
+                playString = "{}can't be played.\n".format(playString)
+                continue
+            playString = "{}scores {} for its rank,".format(playString,rankScore)
+            if adjustedFor is not None:
+                playString = "{0}is adjusted to {1} for the count left ({2}), ".format(playString,max(1, rankScore - 10),adjustedFor)
+            if rewarded:
+                playString = "{}is rewarded for leaving a count of less than 5, ".format(playString)
+            playString = "{} Final score is {}.\n".format(playString,finalScore)
+        if playedCard is None:
+            playString = "{}\tI can't play any of my cards and have to say go!\n".format(playString)
+        else:
+            playString = "{}\tI choose to play {}\n".format(playString,str(playedCard))
+        print(playString)
 
     # Myrmidon does not learn
     def learnFromHandScores(self, scores, gameState):
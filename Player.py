@@ -15,13 +15,13 @@
 #         are used throughout the file. 
 #
 # Dependencies:
-#    - Deck.py (in local project)
 #    - abc (standard python library)
+#    - random (standard python library)
 #
 ################################################################################
 
 from abc import ABC, abstractmethod
-from Deck import Card
+import random
 
 class Player(ABC):
     def __init__(self, number, verbose=False):
@@ -31,6 +31,12 @@ class Player(ABC):
         self.pips = 0
         self.name = "Generic Player"
         self.verbose = verbose
+        # Players make random choices with their own generator so that they can
+        # be seeded independently (see Seeds.py)
+        self.RNG = random.Random(random.getrandbits(64))
+
+    def seed(self, seed):
+        self.RNG.seed(seed)
 
     def newGame(self, gameState):
         self.reset(gameState)
@@ -81,8 +87,7 @@ class Player(ABC):
         pass
 
     def createPlayHand(self):
-        for i in range(0, len(self.hand)):
-            self.playhand.append(Card(self.hand[i].rank, self.hand[i].suit))
+        self.playhand.extend(self.hand)
 
     def getRelativeScore(self, gameState):
         score = 0
@@ -123,4 +128,4 @@ class Player(ABC):
         return checkCard in self.playhand
 
     def draw(self, deck):
-        self.hand.append(deck.cards.pop())
+        self.hand.append(deck.draw())
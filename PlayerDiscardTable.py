@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+################################################################################
+#
+# File : PlayerDiscardTable.py
+# Authors : Kjartan, Tristan
+#
+# Description : A Myrmidon that throws its crib cards by looking them up in the
+#               precomputed discard table instead of simulating starters.
+#
+# Notes : See DiscardTable.py for how the table is built. Pegging is Myrmidon's.
+#
+# Dependencies:
+#    - Myrmidon.py (in local project)
+#    - DiscardTable.py (in local project)
+#    - Utilities.py (in local project)
+#
+################################################################################
+
+# Cribbage imports
+from Myrmidon import Myrmidon
+from DiscardTable import lookupThrow
+from Utilities import cardsString
+
+class PlayerDiscardTable(Myrmidon):
+
+    def __init__(self, number, verboseFlag):
+        super().__init__(number, 1, verboseFlag)
+        self.name = "DiscardTable"
+
+    def throwCribCards(self, numCards, gameState):
+        dealerFlag = gameState['dealer'] == (self.number - 1)
+        cribCards = lookupThrow(self.hand, dealerFlag)
+        self.hand = [card for card in self.hand if card not in cribCards]
+        self.cribThrow = cribCards
+        self.throwReasons = (cribCards, dealerFlag)
+        if self.verbose:
+            print("{} threw {} cards into the crib".format(self.getName(), numCards))
+
+        super().createPlayHand()
+        return cribCards
+
+    def explainThrow(self):
+        if self.throwReasons is None:
+            return
+        cribCards, dealerFlag = self.throwReasons
+        print("{} threw {} into {} crib, the best throw in the discard table.".format(
+            self.getName(), cardsString(cribCards), "its own" if dealerFlag else "the opponent's"))
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+
+################################################################################
+#
+# File : PlayerExpectimax.py
+# Authors : Kjartan, Tristan
+#
+# Description : A Player that chooses pegging plays by an expectimax search over
+#               the rest of the pegging, treating the opponent's unknown cards
+#               as chance events.
+#
+# Notes : Only ranks matter during pegging, so the search state is the ranks in
+#         the player's hand, the number of cards the opponent holds, how many of
+#         each rank are still unseen, the ranks in the current count and whose
+#         turn it is. Go and 31 resets follow Cribbage.play exactly.
+#
+#         The opponent is modelled as holding a random set of the unseen cards
+#         and playing one of its legal cards at random. The chance of it having
+#         no legal card is computed exactly from the unseen cards. Once it says
+#         go it is known to have no legal card until the count is reset.
+#
+#         Positions are memoized in a transposition table for the hand, and the
+#         search stops after maxDepth cards have been played. The default of
+#         4 takes about 3 ms a play on average and under 70 ms at worst. With
+#         maxDepth None it runs to the end of the hand (at most 8 cards at rank
+#         level), which averages about 0.1 s a play, about 1 s at the 95th
+#         percentile and up to 2 or 3 s from the first plays of a hand.
+#
+#         Cards to throw are chosen by the expected score of the kept hand over
+#         every unseen starter, plus or minus the expected score of the crib
+#         the thrown cards go into (see Scoring.expectedCribScore).
+#
+# Dependencies:
+#    - Player.py (in local project)
+#    - Deck.py (in local project)
+#    - Scoring.py (in local project)
+#    - Utilities.py (in local project)
+#    - itertools (standard python library)
+#    - functools (standard python library)
+#    - math (standard python library)
+#    - numpy (third party library)
+#
+################################################################################
+
+# Cribbage imports
+from Player import Player
+from Deck import cardsToIds
+from Scoring import expectedCribScore, getStarterScores
+from Utilities import cardsString
+
+# Utility imports
+from itertools import combinations
+from functools import lru_cache
+from math import comb
+import numpy as np
+
+# The count value of each rank (index 0 is unused)
+RANK_VALUES = (0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10)
+
+# Returns the points for pairs and runs made by playing a card of the given
+# rank after the ranks in tail, as PeggingSequence.scoreParts scores them. A
+# run is at most 7 cards before the count passes 31 and a pair royal at most
+# 4, so tail only needs the last 6 ranks of the count.
+@lru_cache(maxsize=65536)
+def pairRunPoints(tail, rank):
+    sameRank = 1
+    for other in reversed(tail):
+        if other != rank or sameRank == 4:
+            break
+        sameRank += 1
+    if sameRank > 1:
+        # A repeated rank ends any run
+        return sameRank * (sameRank - 1)
+
+    runPips = 0
+    seen = 1 << rank
+    low = high = rank
+    length = 1
+    for other in reversed(tail):
+        if (seen >> other) & 1:
+            break
+        seen |= 1 << other
+        length += 1
+        low = min(low, other)
+        high = max(high, other)
+        if length >= 3 and high - low == length - 1:
+            runPips = length
+    return runPips
+
+# Returns the points for playing a card of the given rank after the ranks in
+# seq, which add up to count
+def pegPoints(seq, count, rank):
+    count += RANK_VALUES[rank]
+    return (2 if count == 15 or count == 31 else 0) + pairRunPoints(seq[-6:], rank)
+
+class PlayerExpectimax(Player):
+
+    def __init__(self, number, verboseFlag, maxDepth=4):
+        super().__init__(number)
+        self.verbose = verboseFlag
+        self.name = "Expectimax"
+        self.maxDepth = maxDepth
+        self.cribThrow = []
+        self.table = {}
+        self.throwReasons = None
+        self.playReasons = None
+
+    def reset(self, gameState=None):
+        super().reset()
+        self.cribThrow = []
+        self.table = {}
+
+    # Keep the four cards with the best expected hand score, counting the
+    # expected score of the crib for or against us depending on whose crib it
+    # is
+    def throwCribCards(self, numCards, gameState):
+        dealerFlag = gameState['dealer'] == (self.number - 1)
+        unseen = np.ones(52, dtype=bool)
+        unseen[cardsToIds(self.hand)] = False
+
+        bestValue = None
+        for keep in combinations(self.hand, len(self.hand) - numCards):
+            thrown = [card for card in self.hand if card not in keep]
+            value = getStarterScores(keep)[unseen].mean()
+            cribValue = expectedCribScore(thrown, dealerFlag)
+            value += cribValue if dealerFlag else -cribValue
+            if bestValue is None or value > bestValue:
+                bestValue = value
+                bestKeep = keep
+
+        cribCards = [card for card in self.hand if card not in bestKeep]
+        self.hand = list(bestKeep)
+        self.cribThrow = cribCards
+        self.throwReasons = (cribCards, bestValue, dealerFlag)
+        if self.verbose:
+            print("{} threw {} cards into the crib".format(self.getName(), numCards))
+
+        super().createPlayHand()
+        return cribCards
+
+    def explainThrow(self):
+        if self.throwReasons is None:
+            return
+        cribCards, value, dealerFlag = self.throwReasons
+        print("{} threw {} into {} crib, expecting {:.2f} points from the hand and crib.".format(
+            self.getName(), cardsString(cribCards), "its own" if dealerFlag else "the opponent's", value))
+
+    def playCard(self, gameState):
+        count = gameState['count']
+        legal = [card for card in self.playhand if count + card.value() <= 31]
+        if len(legal) == 0:
+            self.playReasons = None
+            if self.verbose:
+                print("\t{} says go!".format(self.getName()))
+            return None
+
+        # Everything that isn't in our hand, the starter or already played
+        unseen = [4] * 14
+        unseen[0] = 0
+        seen = set(self.hand) | set(self.cribThrow) | set(gameState['playorder'])
+        if gameState['starter'] is not None:
+            seen.add(gameState['starter'])
+        for card in seen:
+            unseen[card.rankValue] -= 1
+
+        oppNumCards = sum(gameState['numCards']) - len(self.playhand)
+        seq = tuple(card.rankValue for card in gameState['inplay'])
+        # If the last card in the count was ours, the opponent has said go and
+        # can't play again until the count is reset
+        playorder = gameState['playorder']
+        blocked = len(seq) > 0 and playorder[-1] in self.hand
+        mine = tuple(sorted(card.rankValue for card in self.playhand))
+
+        # Without a maxDepth, every card left in play is at most one ply
+        depth = len(self.playhand) + oppNumCards if self.maxDepth is None else self.maxDepth
+        values = {}
+        for card in legal:
+            if card.rankValue not in values:
+                values[card.rankValue] = self.playValue(mine, oppNumCards, tuple(unseen), seq, count, blocked,
+                                                        card.rankValue, 0, depth)
+        playedCard = max(legal, key=lambda card: values[card.rankValue])
+        self.playReasons = (values, playedCard)
+        self.playhand.remove(playedCard)
+        if self.verbose:
+            print("\t{} played {}".format(self.getName(), str(playedCard)))
+        return playedCard
+
+    def explainPlay(self):
+        if self.playReasons is None:
+            print("\t{} had no card to play and said go.".format(self.getName()))
+            return
+        values, playedCard = self.playReasons
+        print("\t{} expected a pegging differential of {}, and played {}.".format(
+            self.getName(), ", ".join("{:.2f} for a {}".format(value, rank) for rank, value in sorted(values.items())),
+            str(playedCard)))
+
+    # Expected pegging differential for the rest of the hand from the given
+    # position, with player (0 for us, 1 for the opponent) to play
+    def search(self, mine, oppNumCards, unseen, seq, count, player, goCounter, blocked, depth):
+        key = (mine, oppNumCards, unseen, seq, player, goCounter, blocked, depth)
+        value = self.table.get(key)
+        if value is not None:
+            return value
+
+        if player == 0:
+            legal = set(rank for rank in mine if count + RANK_VALUES[rank] <= 31)
+            if len(legal) == 0:
+                value = self.goValue(mine, oppNumCards, unseen, seq, count, 0, goCounter, blocked, depth)
+            elif depth == 0:
+                value = 0.0
+            else:
+                value = max(self.playValue(mine, oppNumCards, unseen, seq, count, blocked, rank, 0, depth)
+                            for rank in legal)
+        else:
+            if blocked or oppNumCards == 0:
+                goChance = 1.0
+            else:
+                numUnseen = sum(unseen)
+                numIllegal = sum(unseen[rank] for rank in range(1, 14) if count + RANK_VALUES[rank] > 31)
+                goChance = comb(numIllegal, oppNumCards) / comb(numUnseen, oppNumCards)
+            value = 0.0
+            if goChance > 0:
+                value += goChance * self.goValue(mine, oppNumCards, unseen, seq, count, 1, goCounter, True, depth)
+            if goChance < 1 and depth > 0:
+                numLegal = sum(unseen[rank] for rank in range(1, 14) if count + RANK_VALUES[rank] <= 31)
+                for rank in range(1, 14):
+                    if unseen[rank] > 0 and count + RANK_VALUES[rank] <= 31:
+                        value += (1 - goChance) * unseen[rank] / numLegal * self.playValue(
+                            mine, oppNumCards, unseen, seq, count, blocked, rank, 1, depth)
+
+        self.table[key] = value
+        return value
+
+    # Value of player playing a card of the given rank
+    def playValue(self, mine, oppNumCards, unseen, seq, count, blocked, rank, player, depth):
+        points = pegPoints(seq, count, rank)
+        if player == 0:
+            index = mine.index(rank)
+            mine = mine[:index] + mine[index + 1:]
+        else:
+            points = -points
+            oppNumCards -= 1
+            unseen = unseen[:rank] + (unseen[rank] - 1,) + unseen[rank + 1:]
+        count += RANK_VALUES[rank]
+        if count == 31:
+            return points + self.newCount(mine, oppNumCards, unseen, 1 - player, depth - 1)
+        return points + self.search(mine, oppNumCards, unseen, seq + (rank,), count, 1 - player, 0, blocked,
+                                    depth - 1)
+
+    # Value of player saying go
+    def goValue(self, mine, oppNumCards, unseen, seq, count, player, goCounter, blocked, depth):
+        if goCounter == 0:
+            return self.search(mine, oppNumCards, unseen, seq, count, 1 - player, 1, blocked, depth)
+        # The second go in a row scores a point for the player who said it
+        points = 1 if player == 0 else -1
+        return points + self.newCount(mine, oppNumCards, unseen, 1 - player, depth)
+
+    # Value of starting a new count
+    def newCount(self, mine, oppNumCards, unseen, player, depth):
+        if len(mine) == 0 and oppNumCards == 0:
+            return 0.0
+        return self.search(mine, oppNumCards, unseen, (), 0, player, 0, False, depth)
+
+    # PlayerExpectimax does not learn
+    def learnFromHandScores(self, scores, gameState):
+        pass
+
+    # PlayerExpectimax does not learn
+    def learnFromPegging(self, gameState):
+        pass
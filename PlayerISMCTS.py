@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+
+################################################################################
+#
+# File : PlayerISMCTS.py
+# Authors : Kjartan, Tristan
+#
+# Description : A Player that makes its throws and plays with information set
+#               Monte Carlo tree search.
+#
+# Notes : Each iteration deals the opponent a hand (and, when throwing, a
+#         starter) at random from the cards the player hasn't seen, then plays
+#         the rest of the hand out with random moves. For pegging a single tree
+#         is shared between the different deals, and a move's statistics are
+#         only compared against the moves that were legal in the same deals.
+#         Throws are chosen from the fifteen possible throws with UCB1.
+#
+#         Iterations continue until timeBudget seconds have passed, so strength
+#         can be traded for speed. If maxIterations is set the search stops
+#         after that many iterations instead, which makes seeded runs
+#         reproducible.
+#
+#         PeggingGame is a lightweight copy of the pegging rules in
+#         Cribbage.play, including goes and 31s.
+#
+# Dependencies:
+#    - Player.py (in local project)
+#    - Deck.py (in local project)
+#    - Scoring.py (in local project)
+#    - Utilities.py (in local project)
+#    - itertools (standard python library)
+#    - math (standard python library)
+#    - time (standard python library)
+#
+################################################################################
+
+# Cribbage imports
+from Player import Player
+from Deck import CARDS
+from Scoring import getScore, PeggingSequence
+from Utilities import cardsString
+
+# Utility imports
+from itertools import combinations
+from math import log, sqrt
+import time
+
+# The pegging of one hand between two players, numbered 0 and 1
+class PeggingGame:
+    __slots__ = ('hands', 'sequence', 'toPlay', 'goCounter', 'points', 'over')
+
+    def __init__(self, hands, sequence, toPlay, goCounter=0):
+        self.hands = hands
+        self.sequence = sequence
+        self.toPlay = toPlay
+        self.goCounter = goCounter
+        self.points = [0, 0]
+        self.over = False
+
+    def copy(self):
+        game = PeggingGame.__new__(PeggingGame)
+        game.hands = [list(self.hands[0]), list(self.hands[1])]
+        game.sequence = self.sequence.copy()
+        game.toPlay = self.toPlay
+        game.goCounter = self.goCounter
+        game.points = list(self.points)
+        game.over = self.over
+        return game
+
+    # The cards the player to play can play, or [None] if they must say go
+    def moves(self):
+        sequence = self.sequence
+        legal = [card for card in self.hands[self.toPlay] if sequence.canPlay(card)]
+        return legal if legal else [None]
+
+    def apply(self, card):
+        player = self.toPlay
+        if card is None:
+            if self.goCounter == 0:
+                self.goCounter = 1
+            else:
+                self.goCounter = 2
+                self.points[player] += 1
+        else:
+            self.hands[player].remove(card)
+            self.points[player] += self.sequence.play(card)
+            self.goCounter = 0
+        self.toPlay = 1 - player
+
+        if self.goCounter == 2 or self.sequence.count == 31:
+            if not self.hands[0] and not self.hands[1]:
+                self.over = True
+            else:
+                self.sequence.reset()
+                self.goCounter = 0
+
+    # Plays random moves until the pegging is over
+    def rollout(self, RNG):
+        while not self.over:
+            self.apply(RNG.choice(self.moves()))
+
+class Node:
+    __slots__ = ('move', 'player', 'parent', 'children', 'visits', 'reward', 'available')
+
+    def __init__(self, move=None, player=None, parent=None):
+        self.move = move
+        self.player = player
+        self.parent = parent
+        self.children = {}
+        self.visits = 0
+        self.reward = 0.0
+        self.available = 0
+
+    # Upper confidence bound, counting only the iterations in which the move
+    # could have been made
+    def ucb(self, exploration):
+        return self.reward / self.visits + exploration * sqrt(log(self.available) / self.visits)
+
+class PlayerISMCTS(Player):
+
+    def __init__(self, number, verboseFlag, timeBudget=0.05, maxIterations=None, exploration=2.0):
+        super().__init__(number)
+        self.verbose = verboseFlag
+        self.name = "ISMCTS"
+        self.timeBudget = timeBudget
+        self.maxIterations = maxIterations
+        self.exploration = exploration
+        self.cribThrow = []
+        self.throwReasons = None
+        self.playReasons = None
+
+    def reset(self, gameState=None):
+        super().reset()
+        self.cribThrow = []
+
+    # True while the search has iterations left
+    def searching(self, iterations, deadline):
+        if self.maxIterations is not None:
+            return iterations < self.maxIterations
+        return iterations == 0 or time.perf_counter() < deadline
+
+    def throwCribCards(self, numCards, gameState):
+        dealerFlag = gameState['dealer'] == (self.number - 1)
+        unseen = [card for card in CARDS if card not in self.hand]
+        throws = list(combinations(self.hand, numCards))
+        visits = [0] * len(throws)
+        rewards = [0.0] * len(throws)
+
+        iterations = 0
+        deadline = time.perf_counter() + self.timeBudget
+        while self.searching(iterations, deadline):
+            iterations += 1
+            if iterations <= len(throws):
+                choice = iterations - 1
+            else:
+                logIterations = log(iterations)
+                choice = max(range(len(throws)), key=lambda i: rewards[i] / visits[i] +
+                             self.exploration * sqrt(logIterations / visits[i]))
+
+            # Deal the opponent a hand and a starter, and have it throw at random
+            dealt = self.RNG.sample(unseen, 7)
+            starter = dealt[6]
+            opponentThrow = dealt[4:6]
+            thrown = list(throws[choice])
+            keep = [card for card in self.hand if card not in thrown]
+
+            reward = getScore(keep, starter, False)
+            cribScore = getScore(thrown + opponentThrow, starter, False)
+            reward += cribScore if dealerFlag else -cribScore
+            # The player who isn't the dealer plays first
+            game = PeggingGame([list(keep), dealt[:4]], PeggingSequence(), 1 if dealerFlag else 0)
+            game.rollout(self.RNG)
+            reward += game.points[0] - game.points[1]
+
+            visits[choice] += 1
+            rewards[choice] += reward
+
+        best = max(range(len(throws)), key=lambda i: visits[i])
+        cribCards = list(throws[best])
+        self.hand = [card for card in self.hand if card not in cribCards]
+        self.cribThrow = cribCards
+        self.throwReasons = (cribCards, rewards[best] / visits[best], visits[best], iterations)
+        if self.verbose:
+            print("{} threw {} cards into the crib".format(self.getName(), numCards))
+
+        super().createPlayHand()
+        return cribCards
+
+    def explainThrow(self):
+        if self.throwReasons is None:
+            return
+        cribCards, value, visits, iterations = self.throwReasons
+        print("{} threw {}, which averaged {:.2f} points in {} of {} simulations.".format(
+            self.getName(), cardsString(cribCards), value, visits, iterations))
+
+    def playCard(self, gameState):
+        count = gameState['count']
+        legal = [card for card in self.playhand if count + card.value() <= 31]
+        if len(legal) <= 1:
+            self.playReasons = None
+            playedCard = legal[0] if legal else None
+        else:
+            playedCard = self.search(gameState)
+
+        if playedCard is None:
+            if self.verbose:
+                print("\t{} says go!".format(self.getName()))
+            return None
+        self.playhand.remove(playedCard)
+        if self.verbose:
+            print("\t{} played {}".format(self.getName(), str(playedCard)))
+        return playedCard
+
+    # Searches the rest of the pegging and returns the most visited card
+    def search(self, gameState):
+        count = gameState['count']
+        seen = set(self.hand) | set(self.cribThrow) | set(gameState['playorder'])
+        if gameState['starter'] is not None:
+            seen.add(gameState['starter'])
+        unseen = [card for card in CARDS if card not in seen]
+        oppNumCards = sum(gameState['numCards']) - len(self.playhand)
+
+        # If the last card in the count was ours the opponent has said go, so
+        # it can only hold cards that don't fit in the count
+        inplay = gameState['inplay']
+        blocked = len(inplay) > 0 and gameState['playorder'][-1] in self.hand
+        if blocked:
+            illegal = [card for card in unseen if count + card.value() > 31]
+            if len(illegal) >= oppNumCards:
+                unseen = illegal
+        pegging = gameState.get('pegging')
+        sequence = pegging.copy() if pegging is not None else PeggingSequence(inplay)
+
+        root = Node()
+        iterations = 0
+        deadline = time.perf_counter() + self.timeBudget
+        while self.searching(iterations, deadline):
+            iterations += 1
+            game = PeggingGame([list(self.playhand), self.RNG.sample(unseen, oppNumCards)], sequence.copy(), 0,
+                               1 if blocked else 0)
+
+            # Select down the tree while every legal move has been tried
+            node = root
+            while not game.over:
+                moves = game.moves()
+                untried = [move for move in moves if move not in node.children]
+                if untried:
+                    break
+                children = [node.children[move] for move in moves]
+                for child in children:
+                    child.available += 1
+                node = max(children, key=lambda child: child.ucb(self.exploration))
+                game.apply(node.move)
+
+            # Expand one untried move
+            if not game.over:
+                for move in moves:
+                    if move in node.children:
+                        node.children[move].available += 1
+                move = self.RNG.choice(untried)
+                child = Node(move, game.toPlay, node)
+                child.available = 1
+                node.children[move] = child
+                node = child
+                game.apply(move)
+
+            game.rollout(self.RNG)
+
+            # Each node is credited with the points for the player who moved
+            # into it
+            difference = game.points[0] - game.points[1]
+            while node is not root:
+                node.visits += 1
+                node.reward += difference if node.player == 0 else -difference
+                node = node.parent
+
+        candidates = [child for child in root.children.values() if child.move in self.playhand]
+        best = max(candidates, key=lambda child: child.visits)
+        self.playReasons = ([(child.move, child.visits, child.reward / child.visits) for child in candidates],
+                            best.move, iterations)
+        return best.move
+
+    def explainPlay(self):
+        if self.playReasons is None:
+            print("\t{} had only one choice.".format(self.getName()))
+            return
+        candidates, playedCard, iterations = self.playReasons
+        print("\t{} ran {} simulations: {}. It played {}.".format(
+            self.getName(), iterations,
+            ", ".join("{} visited {} times for {:.2f}".format(str(card), visits, value)
+                      for card, visits, value in candidates), str(playedCard)))
+
+    # PlayerISMCTS does not learn
+    def learnFromHandScores(self, scores, gameState):
+        pass
+
+    # PlayerISMCTS does not learn
+    def learnFromPegging(self, gameState):
+        pass
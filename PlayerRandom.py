@@ -16,7 +16,7 @@
 #    - Deck.py (in local project)
 #    - Arena.py (in local project)          * - for __name__ = '__main__' only
 #    - Myrmidon.py (in local project)       * - for __name__ = '__main__' only
-#    - numpy (standard python library)      * - for __name__ = '__main__' only
+#    - numpy (third party library)          * - for __name__ = '__main__' only
 #    - random (standard python library)
 #    - matplotlib (standard python library) * - for __name__ = '__main__' only
 #
@@ -52,7 +52,7 @@ class PlayerRandom(Player):
         cribCards = []
 
         for i in range(0, numCards):
-            cribCards.append(self.hand.pop(random.randrange(len(self.hand))))
+            cribCards.append(self.hand.pop(self.RNG.randrange(len(self.hand))))
         
         if self.verbose:
             print("{} threw {} cards into the crib".format(self.getName(), numCards))
@@ -68,7 +68,7 @@ class PlayerRandom(Player):
         count = gameState['count']
         if len(self.playhand) != 0:
             while playedCard is None:
-                index = random.randint(0, len(cardIndices) - 1)
+                index = self.RNG.randint(0, len(cardIndices) - 1)
                 cardIndex = cardIndices[index]
                 if count + self.playhand[cardIndex].value() < 32:
                     playedCard = self.playhand.pop(cardIndex)
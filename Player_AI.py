@@ -9,13 +9,18 @@
 #
 # Notes : Player_AI is a simple AI that makes decisions based on the current game
 #
+#         Its throws count the expected crib from Scoring.expectedCribScore. If
+#         the crib table hasn't been saved yet, the first throw builds it, which
+#         takes about 20 seconds (run DiscardTable.py to build it beforehand).
+#
 # Dependencies:
 #    - Player.py (in local project)
 #    - Utilities.py (in local project)
 #    - Deck.py (in local project)
+#    - Scoring.py (in local project)
 #    - Arena.py (in local project)          * - for __name__ = '__main__' only
 #    - Myrmidon.py (in local project)       * - for __name__ = '__main__' only
-#    - numpy (standard python library)      * - for __name__ = '__main__' only
+#    - numpy (third party library)
 #    - random (standard python library)
 #    - matplotlib (standard python library) * - for __name__ = '__main__' only
 #
@@ -25,9 +30,9 @@
 from calendar import c
 from Player import Player
 from Utilities import *
-from Deck import Card,RiggedDeck, Deck
+from Deck import Card,RiggedDeck, Deck, FULL_MASK, cardsToIds, cardsToMask, maskToCards
 from Arena import Arena
-from Scoring import getScoreNoStarter, getScore, scoreCards
+from Scoring import PeggingSequence, getScoreNoStarter, getScore, getScoreBatch, expectedCribScore
 
 # Player imports
 from Myrmidon import Myrmidon
@@ -68,51 +73,34 @@ class Player_AI(Player):
    
 
 
-    # takes in a list of lists with the inner list containg a list with [hand, hand_score, card, crib_cards]
-    #outermost list of list where each list contains a different hand 
-    # inner contains a list of the hand with every possible starter card and the score of that hand with that starter card
-    def analyzeCribCards(self, scored_hands):
-        bestHand = []
-        avgResult = []
-        hand_list = []
-        for hand in scored_hands:
-            avg= 0
-            for hand_score in hand:
-                avg += hand_score[1]
-            avg =avg/15
-            avgResult.append(avg)
-            hand_list.append([hand_score[0],hand_score[3]])
-        max_score = max(avgResult)
-        index = avgResult.index(max_score)
-        bestHand = hand_list[index]
-        return bestHand
+    # takes in the list of possible hands and the matrix of their scores, with a
+    # row for each hand and a column for every possible starter card
+    # returns the hand with the highest average score and the matching crib cards
+    # if dealerFlag is given, the expected crib of the thrown cards is added
+    # (our crib) or subtracted (opponent's crib)
+    def analyzeCribCards(self, possible_hands, scores, dealerFlag=None):
+        values = scores.mean(axis=1)
+        if dealerFlag is not None:
+            for i, hand in enumerate(possible_hands):
+                cribValue = expectedCribScore([x for x in self.hand if x not in hand], dealerFlag)
+                values[i] += cribValue if dealerFlag else -cribValue
+        index = int(np.argmax(values))
+        bestHand = list(possible_hands[index])
+        crib_cards = [x for x in self.hand if x not in bestHand]
+        return [bestHand, crib_cards]
     
+    # returns the cards left in the deck once the given hand is removed
     def get_deck_without_hand(self, hand):
-        deck = Deck(1)
-        for card in hand:
-            deck.cards.remove(card)
-        return deck
+        return maskToCards(FULL_MASK & ~cardsToMask(hand))
 
-    def __CribCardsWithstarter__(self):
-            possible_hands = combinations(self.hand, 4)
+    def __CribCardsWithstarter__(self, dealerFlag=None):
+            possible_hands = list(combinations(self.hand, 4))
             deck = self.get_deck_without_hand(self.hand)
-            bestHand = []
-            scores = []
-            for hand in possible_hands: 
-                hand = list(hand)
-                crib_cards = [x for x in self.hand if x not in hand]
-                scores_with_card=[]
-                for card in deck.cards: # check every card in the deck with the hand given
-                    hand_score = getScore(hand, card, False)
-                    
-                    scores_with_card.append([hand, hand_score, card, crib_cards]) #create a list of lists with the hand, score, starter card, and crib cards
-                scores.append(scores_with_card)
-            return self.analyzeCribCards(scores)
-    
-
-
-        
-    
+            # score every hand with every card left in the deck as the starter
+            keeps = np.array([cardsToIds(hand) for hand in possible_hands])
+            starters = np.array(cardsToIds(deck))
+            scores = getScoreBatch(keeps, starters)
+            return self.analyzeCribCards(possible_hands, scores, dealerFlag)
     
     def __selectCard__(self, handSize):
         return random.randrange(0,handSize,1)
@@ -123,7 +111,8 @@ class Player_AI(Player):
         handSize = len(self.hand)
 
         # Function to determine which cards to throw into the crib
-        self.hand, cribCards = self.__CribCardsWithstarter__()
+        dealerFlag = gameState['dealer'] == (self.number - 1)
+        self.hand, cribCards = self.__CribCardsWithstarter__(dealerFlag)
         if self.verbose:
             print("{} threw {} cards into the crib".format(self.getName(), numCards))
 
@@ -179,17 +168,19 @@ class Player_AI(Player):
     def playCard(self, gameState):
         selected_card = None
         count = gameState['count']
-        countCards = gameState['inplay']
+        if 'pegging' in gameState:
+            pegging = gameState['pegging']
+        else:
+            pegging = PeggingSequence(gameState['inplay'])
         card_scores = np.zeros(len(self.playhand))
-        for card, i in self.playhand.enumerate():
-            played_cards_new = countCards.append(card)
+        for i, card in enumerate(self.playhand):
             if card.value() + count <= 31:
-                card_scores[i] += 10 * scoreCards(played_cards_new, False) + self.playhand[i].rank.value
+                card_scores[i] += 10 * pegging.score(card) + self.playhand[i].rankValue
                 if (card.value() + count == 10) or (card.value() + count == 5) or (card.value() + count == 21):
                     card_scores[i] = max(1, card_scores[i] - 10)
                 if card.value() + count <= 5:
                     card_scores[i] += 15
-        if np.amax(card_scores) > 0:
+        if len(card_scores) > 0 and np.amax(card_scores) > 0:
             selected_card = self.playhand.pop(max(range(len(card_scores)), key=card_scores.__getitem__))
         return selected_card
     
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+################################################################################
+#
+# File : ReplayBuffer.py
+# Authors : Kjartan, Tristan
+#
+# Description : A fixed-capacity ring buffer of pegging transitions, stored as
+#               fixed-width NumPy records that can be backed by a memory-mapped
+#               file, and a recorder that fills it from a player's games.
+#
+# Notes : Each record is one pegging decision from the deciding player's side:
+#         its cards, the cards played this hand, the starter, the count, both
+#         scores and card counts, and whether it dealt (own values first);
+#         the card it played (NO_CARD for a go); the reward; and whether the
+#         hand ended after it. Cards are card ids (see Deck.py) padded with
+#         NO_CARD. FeatureEncoder.py turns records into model inputs.
+#
+#         The reward of a decision is the change in the player's lead (its
+#         score less its opponent's) from that decision to its next one. For
+#         the last decision of a hand it runs to the end of the hand, so it
+#         includes the hand and crib scores, and a hand's rewards add up to
+#         the change in its lead from its first play to the end of the hand
+#         (everything but his heels).
+#
+#         Records of the same hand are linked: 'next' is the index of the
+#         player's following decision, or -1 after the last one. A record can
+#         be overwritten once the buffer wraps around, so nextRecords also
+#         checks that the linked record is still from the same episode.
+#
+#         With a file name the records live in a .npy file opened with
+#         numpy.lib.format.open_memmap, and the buffer's position is saved
+#         next to it as JSON by flush, so a later run can resume filling it.
+#         Memory use is fixed by the capacity however many transitions pass
+#         through.
+#
+#         A ReplayRecorder attaches to a player by replacing its playCard and
+#         learnFromHandScores methods on the instance with versions that record
+#         and then call the originals (as Instrumentation.py does), so any
+#         player can be recorded. The actions come from playCard because
+#         learnFromPegging isn't told which card was played.
+#
+# Dependencies:
+#    - numpy (third party library)
+#    - json (standard python library)
+#    - os (standard python library)
+#
+################################################################################
+
+import numpy as np
+import json
+import os
+
+# Pads card id fields, and is the action of a go
+NO_CARD = 52
+
+RECORD_DTYPE = np.dtype([
+    ('episode', '<u4'),
+    ('step', 'u1'),
+    ('next', '<i8'),
+    ('hand', 'u1', (4,)),
+    ('playorder', 'u1', (8,)),
+    ('inplay', 'u1'),
+    ('starter', 'u1'),
+    ('count', 'u1'),
+    ('scores', '<i2', (2,)),
+    ('numCards', 'u1', (2,)),
+    ('dealer', 'u1'),
+    ('action', 'u1'),
+    ('reward', '<f4'),
+    ('done', '?'),
+])
+
+# Card ids of cards, padded with NO_CARD to length
+def paddedIds(cards, length):
+    ids = [card.id for card in cards]
+    return ids + [NO_CARD] * (length - len(ids))
+
+# The state fields of a record (hand up to dealer) for the player in seat own
+# (0 or 1) holding hand
+def stateFields(gameState, hand, own):
+    scores = gameState['scores']
+    numCards = gameState['numCards']
+    return (paddedIds(hand, 4), paddedIds(gameState['playorder'], 8), len(gameState['inplay']),
+            NO_CARD if gameState['starter'] is None else gameState['starter'].id, gameState['count'],
+            (scores[own], scores[1 - own]), (numCards[own], numCards[1 - own]), gameState['dealer'] == own)
+
+class ReplayBuffer:
+    def __init__(self, capacity, fileName=None, resume=False):
+        self.capacity = capacity
+        self.fileName = fileName
+        # Total records ever appended, and episodes started
+        self.appended = 0
+        self.episodes = 0
+        if fileName is None:
+            self.records = np.zeros(capacity, dtype=RECORD_DTYPE)
+        elif resume and os.path.exists(fileName):
+            self.records = np.lib.format.open_memmap(fileName, mode='r+')
+            if self.records.dtype != RECORD_DTYPE or len(self.records) != capacity:
+                raise ValueError("{} doesn't hold a replay buffer of {} records".format(fileName, capacity))
+            if os.path.exists(self.metadataFile()):
+                with open(self.metadataFile()) as file:
+                    metadata = json.load(file)
+                self.appended = metadata['appended']
+                self.episodes = metadata['episodes']
+        else:
+            self.records = np.lib.format.open_memmap(fileName, mode='w+', dtype=RECORD_DTYPE, shape=(capacity,))
+
+    def metadataFile(self):
+        return self.fileName + ".json"
+
+    def __len__(self):
+        return min(self.appended, self.capacity)
+
+    # Returns the id of a new episode
+    def newEpisode(self):
+        self.episodes += 1
+        return self.episodes
+
+    # Writes a record (a tuple of the fields of RECORD_DTYPE, in order) over
+    # the oldest one and returns its index
+    def append(self, record):
+        index = self.appended % self.capacity
+        self.records[index] = record
+        self.appended += 1
+        return index
+
+    # Sets the outcome of an earlier record, once it is known
+    def settle(self, index, reward, done=False, nextIndex=-1):
+        record = self.records[index]
+        record['reward'] = reward
+        record['done'] = done
+        record['next'] = nextIndex
+
+    # A random minibatch of records (a copy)
+    def sample(self, batchSize, RNG=None):
+        if len(self) == 0:
+            raise ValueError("Can't sample from an empty replay buffer")
+        if RNG is None:
+            RNG = np.random.default_rng()
+        return self.records[RNG.integers(0, len(self), batchSize)]
+
+    # The records that follow a batch of records in their episodes, and which
+    # of them are valid (the batch record isn't the last of its episode and
+    # its successor hasn't been overwritten)
+    def nextRecords(self, batch):
+        indices = np.maximum(batch['next'], 0)
+        following = self.records[indices]
+        valid = (batch['next'] >= 0) & ~batch['done'] & (following['episode'] == batch['episode'])
+        return following, valid
+
+    # The records from oldest to newest
+    def ordered(self):
+        if self.appended <= self.capacity:
+            return self.records[:self.appended]
+        start = self.appended % self.capacity
+        return np.concatenate([self.records[start:], self.records[:start]])
+
+    def flush(self):
+        if self.fileName is None:
+            return
+        self.records.flush()
+        with open(self.metadataFile(), 'w') as file:
+            json.dump({'capacity': self.capacity, 'appended': self.appended, 'episodes': self.episodes}, file)
+
+    def close(self):
+        self.flush()
+        self.records = None
+
+# Records a player's pegging decisions into a replay buffer
+class ReplayRecorder:
+    def __init__(self, replayBuffer, player):
+        self.buffer = replayBuffer
+        self.player = player
+        self.episode = None
+        self.step = 0
+        # The latest decision, whose reward isn't known yet, and the player's
+        # lead when it was made
+        self.pending = None
+        self.pendingLead = 0
+        self.originals = {}
+        self.attach()
+
+    def attach(self):
+        for name in ('playCard', 'learnFromHandScores'):
+            self.originals[name] = self.player.__dict__.get(name)
+        original = self.player.playCard
+        learn = self.player.learnFromHandScores
+
+        def playCard(gameState):
+            hand = list(self.player.playhand)
+            card = original(gameState)
+            if hand:
+                self.record(gameState, hand, card)
+            return card
+
+        def learnFromHandScores(scores, gameState):
+            self.endEpisode(gameState)
+            return learn(scores, gameState)
+
+        self.player.playCard = playCard
+        self.player.learnFromHandScores = learnFromHandScores
+
+    # Puts back the player's own methods
+    def detach(self):
+        for name, original in self.originals.items():
+            if original is None:
+                delattr(self.player, name)
+            else:
+                setattr(self.player, name, original)
+        self.originals = {}
+
+    # The player's score less its opponent's
+    def lead(self, gameState):
+        scores = gameState['scores']
+        own = self.player.number - 1
+        return scores[own] - scores[1 - own]
+
+    def record(self, gameState, hand, card):
+        lead = self.lead(gameState)
+        if self.episode is None:
+            self.episode = self.buffer.newEpisode()
+            self.step = 0
+        index = self.buffer.append((self.episode, min(self.step, 255), -1) +
+                                   stateFields(gameState, hand, self.player.number - 1) +
+                                   (NO_CARD if card is None else card.id, 0.0, False))
+        if self.pending is not None:
+            self.buffer.settle(self.pending, lead - self.pendingLead, False, index)
+        self.pending = index
+        self.pendingLead = lead
+        self.step += 1
+
+    def endEpisode(self, gameState):
+        if self.pending is not None:
+            self.buffer.settle(self.pending, self.lead(gameState) - self.pendingLead, True)
+        self.pending = None
+        self.episode = None
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+################################################################################
+#
+# File : ResultSink.py
+# Authors : Kjartan, Tristan
+#
+# Description : Writes the records produced by Arena.streamHands to disk as
+#               compact columns that can be memory-mapped for analysis.
+#
+# Notes : Each column is a flat file of little-endian int16 values named
+#         <column>.i16 in the sink's directory, with one row per play through
+#         (row 2 * hand + dealer). Rows are buffered and appended in chunks, so
+#         memory use stays flat however long the run is, and the files can be
+#         loaded with loadColumns while the run is still going (it only returns
+#         the rows every column has been written up to).
+#
+# Dependencies:
+#    - numpy (third party library)
+#    - os (standard python library)
+#
+################################################################################
+
+import numpy as np
+import os
+
+# The columns written for every record. The four throws are the card ids that
+# went into the crib, player 1's two cards first.
+COLUMNS = ('dealer', 'starter', 'throw0', 'throw1', 'throw2', 'throw3', 'pegging', 'hands', 'total')
+COLUMN_TYPE = np.dtype('<i2')
+
+class ResultSink:
+    def __init__(self, directory, chunkSize=65536):
+        self.directory = directory
+        self.chunkSize = chunkSize
+        self.buffer = np.zeros((chunkSize, len(COLUMNS)), dtype=COLUMN_TYPE)
+        self.numBuffered = 0
+        self.numWritten = 0
+        os.makedirs(directory, exist_ok=True)
+        # Start each column empty
+        for column in COLUMNS:
+            open(self.columnFile(column), 'wb').close()
+
+    def columnFile(self, column):
+        return os.path.join(self.directory, column + ".i16")
+
+    # Adds one record (as yielded by Arena.streamHands) to the sink
+    def write(self, record):
+        row = self.buffer[self.numBuffered]
+        row[0] = record['dealer']
+        row[1] = record['starter']
+        row[2:6] = record['throws']
+        row[6] = record['pegging']
+        row[7] = record['hands']
+        row[8] = record['total']
+        self.numBuffered += 1
+        if self.numBuffered == self.chunkSize:
+            self.flush()
+
+    # Writes every record from an iterable of records and returns how many
+    # records the sink holds
+    def consume(self, records):
+        for record in records:
+            self.write(record)
+        self.flush()
+        return self.numWritten
+
+    # Appends the buffered rows to the column files
+    def flush(self):
+        if self.numBuffered == 0:
+            return
+        for i, column in enumerate(COLUMNS):
+            with open(self.columnFile(column), 'ab') as columnFile:
+                columnFile.write(np.ascontiguousarray(self.buffer[:self.numBuffered, i]).tobytes())
+        self.numWritten += self.numBuffered
+        self.numBuffered = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+# Memory-maps the columns written to a directory by a ResultSink. Returns a
+# dictionary of read-only arrays holding every row written so far. A flush
+# appends to one column file at a time, so while a run is going some columns
+# can be ahead of others; every column is cut to the rows all of them hold.
+def loadColumns(directory):
+    fileNames = {column: os.path.join(directory, column + ".i16") for column in COLUMNS}
+    numRows = min(os.path.getsize(fileName) for fileName in fileNames.values()) // COLUMN_TYPE.itemsize
+    columns = {}
+    for column, fileName in fileNames.items():
+        if numRows == 0:
+            columns[column] = np.zeros(0, dtype=COLUMN_TYPE)
+        else:
+            columns[column] = np.memmap(fileName, dtype=COLUMN_TYPE, mode='r', shape=(numRows,))
+    return columns
@@ -10,24 +10,378 @@
 # Notes : There are essentially two types of functions: those that score entire
 #         hands and those that score the count during pegging.
 #
-#         The verboseFlag is used throughout to control whether or not print
-#         commands are used.
+#         Four card hands with a starter are normally scored by looking them up
+#         in a precomputed table of every hand and starter (see buildScoreTable).
+#         The table is built the first time it is needed and saved alongside
+#         this file so later runs can memory-map it. getScoreReference is the
+#         original implementation; it builds the table and is used whenever the
+#         table can't answer (verbose output, other hand sizes).
+#
+#         getScoreBatch scores arrays of card ids with NumPy, for callers that
+#         need every keep scored against every possible starter at once.
+#
+#         expectedCribScore looks up the expected crib that two thrown cards go
+#         into, from a table built offline (see DiscardTable.buildCribTable).
+#
+#         Tables are built under a lock (see loadTables), so threads and
+#         processes that need a table at the same time build it only once, and
+#         are written to a temporary file that is renamed into place, so a half
+#         written table is never memory-mapped. The hand score table takes a
+#         couple of seconds to build, but the crib table takes about 20 seconds
+#         and close to 600 MB of memory, and building every table takes about
+#         40 seconds. DiscardTable.prebuildTables builds them all up front.
+#
+#         Hands are scored by scoreBreakdown, which returns the points by
+#         category as a HandScore. The verboseFlag is used throughout to control
+#         whether or not print commands are used; for hands, the breakdown is
+#         only printed when it is set.
 #
 # Dependencies:
 #    - Deck.py (in local project)
 #    - Utilities.py (in local project)
+#    - collections (standard python library)
+#    - contextlib (standard python library)
+#    - functools (standard python library)
+#    - fcntl (standard python library, where available)
 #    - itertools (standard python library)
 #    - math (standard python library)
+#    - numpy (third party library)
+#    - os (standard python library)
+#    - tempfile (standard python library)
+#    - threading (standard python library)
 #
 ################################################################################
 
 from Deck import *
 from Utilities import *
-from itertools import combinations
-from math import factorial
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import combinations, combinations_with_replacement, permutations
+from math import factorial, comb
+import numpy as np
+import os
+import tempfile
+import threading
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Location of the precomputed hand score table and the value used in it to
+# mark impossible entries (the starter is one of the hand's cards)
+SCORE_TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "handScoreTable.npy")
+NO_SCORE = 255
+
+# Location of the expected crib score of every two card throw. The version in
+# its name changes whenever the table's layout or the way it is built does, so
+# tables saved by older versions are rebuilt instead of reused.
+CRIB_TABLE_VERSION = 1
+CRIB_TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               "cribTable.v{}.npy".format(CRIB_TABLE_VERSION))
+
+# Binomial coefficients used to rank a sorted four card hand in the table
+_BINOMIALS = [[comb(n, k) for n in range(52)] for k in range(5)]
+_scoreTable = None
+_throwScoreTable = None
+_tableLock = threading.RLock()
+_cribTable = None
+
+# The points a hand scored, broken down by the way they were scored
+class HandScore(namedtuple('HandScore', ['fifteens', 'pairs', 'runs', 'flush', 'nobs'])):
+    __slots__ = ()
+
+    def total(self):
+        return self.fifteens + self.pairs + self.runs + self.flush + self.nobs
+
+    def __str__(self):
+        lines = []
+        for name, label in [('fifteens', 'Fifteens'), ('pairs', 'Pairs'), ('runs', 'Runs'),
+                            ('flush', 'Flush'), ('nobs', 'Nobs')]:
+            if getattr(self, name) > 0:
+                lines.append("\t{} for {}!".format(label, getattr(self, name)))
+        lines.append("\tTotal of {}.".format(self.total()))
+        return "\n".join(lines)
 
 # These functions score a given hand and starter card.
 def getScore(hand, starter, verbose):
+    if not verbose and len(hand) == 4:
+        pips = lookupScore(hand, starter)
+        if pips is not None:
+            return pips
+    breakdown = scoreBreakdown(hand, starter)
+    if verbose:
+        print(breakdown)
+    return breakdown.total()
+
+# Scores a hand (and optional starter) from a single histogram of its ranks
+# and returns the points as a HandScore
+def scoreBreakdown(hand, starter=None):
+    cards = hand if starter is None else hand + [starter]
+    counts = [0] * 15
+    ways = [1] + [0] * 15
+    for card in cards:
+        counts[card.rankValue] += 1
+        # Count the subsets of cards that sum to each value up to 15
+        value = card.pips
+        for total in range(15, value - 1, -1):
+            ways[total] += ways[total - value]
+
+    pairs = 0
+    runs = 0
+    runLength = 0
+    runCombinations = 1
+    for rank in range(1, 15):
+        count = counts[rank]
+        pairs += count * (count - 1)
+        if count > 0:
+            runLength += 1
+            runCombinations *= count
+        else:
+            if runLength >= 3:
+                runs += runLength * runCombinations
+            runLength = 0
+            runCombinations = 1
+
+    flush = 0
+    nobs = 0
+    if starter is not None:
+        suit = hand[0].suit
+        if all(card.suit is suit for card in hand):
+            flush = 5 if starter.suit is suit else 4
+        for card in hand:
+            if card.rank is Rank.Jack and card.suit is starter.suit:
+                nobs = 1
+
+    return HandScore(2 * ways[15], pairs, runs, flush, nobs)
+
+# Scores a four card hand and starter with a single table lookup. Returns None
+# if the table can't be used for this hand.
+def lookupScore(hand, starter):
+    table = getScoreTable()
+    if table is None:
+        return None
+    ids = sorted([card.id for card in hand])
+    index = _BINOMIALS[1][ids[0]] + _BINOMIALS[2][ids[1]] + _BINOMIALS[3][ids[2]] + _BINOMIALS[4][ids[3]]
+    pips = int(table[index, starter.id])
+    if pips == NO_SCORE:
+        return None
+    return pips
+
+# Returns the hand score table, loading it from disk (or building it) the first
+# time it is requested.
+def getScoreTable():
+    global _scoreTable
+    if _scoreTable is None:
+        _scoreTable, = loadTables([SCORE_TABLE_FILE], lambda: (buildScoreTable(),), "hand score table")
+    return _scoreTable
+
+# Returns the table of the expected crib score for every two card throw,
+# loading it from disk (or building it) the first time it is requested. Row i
+# holds the throw whose sorted card ids a < b satisfy i = C(a,1) + C(b,2);
+# column 0 is for a thrower who isn't the dealer and column 1 for the dealer.
+def getCribTable():
+    global _cribTable
+    if _cribTable is None:
+        # The crib table is built from the discard table, which uses this
+        # module, so it is only imported when needed
+        def build():
+            from DiscardTable import buildCribTable
+            return (buildCribTable(),)
+        _cribTable, = loadTables([CRIB_TABLE_FILE], build, "expected crib table")
+    return _cribTable
+
+# Returns the tables saved in fileNames, memory-mapped, or builds them with
+# build (which returns them in the same order) and saves them if any is
+# missing. Only one thread or process builds a table at a time; the others
+# wait for it and then load what it saved.
+def loadTables(fileNames, build, description):
+    def saved():
+        return all(os.path.exists(fileName) for fileName in fileNames)
+
+    if not saved():
+        with tableLock(fileNames[0]):
+            if not saved():
+                print("Building the {}. This is only done once.".format(description))
+                tables = build()
+                for fileName, table in zip(fileNames, tables):
+                    saveTable(fileName, table)
+                if not saved():
+                    return tables
+    return tuple(np.load(fileName, mmap_mode='r') for fileName in fileNames)
+
+# Holds the lock for building a table, between the threads of this process and
+# (where fcntl is available) between processes
+@contextmanager
+def tableLock(fileName):
+    with _tableLock:
+        try:
+            lockFile = open(fileName + ".lock", 'a')
+        except OSError:
+            lockFile = None
+        if lockFile is None or fcntl is None:
+            yield
+        else:
+            with lockFile:
+                fcntl.flock(lockFile, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+# Saves a table so that it appears at fileName all at once. It is written to a
+# temporary file next to it and renamed, so a file that exists is never half
+# written. Tables that can't be saved are rebuilt the next time.
+def saveTable(fileName, table):
+    handle, temporary = None, None
+    try:
+        handle, temporary = tempfile.mkstemp(suffix=".npy", dir=os.path.dirname(os.path.abspath(fileName)))
+        with os.fdopen(handle, 'wb') as file:
+            np.save(file, table)
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, fileName)
+    except OSError:
+        if temporary is not None and os.path.exists(temporary):
+            os.remove(temporary)
+
+# The expected score of the crib that two thrown cards go into, given whether
+# the thrower is the dealer, over the opponent's likely throws and the starter
+def expectedCribScore(cards, dealerFlag):
+    first, second = sorted(card.id for card in cards)
+    return float(getCribTable()[_BINOMIALS[1][first] + _BINOMIALS[2][second], int(dealerFlag)])
+
+# Builds the table of scores for every four card hand and every starter. Row i
+# holds the hand whose sorted card ids a < b < c < d satisfy
+# i = C(a,1) + C(b,2) + C(c,3) + C(d,4); column j is the starter with id j.
+def buildScoreTable(fileName=None):
+    # Fifteens, pairs and runs only depend on the five ranks involved, so score
+    # every multiset of ranks once with the reference implementation
+    rankScores = np.zeros((13, 13, 13, 13, 13), dtype=np.uint8)
+    for ranks in combinations_with_replacement(range(1, 14), 5):
+        cards = [Card(rank, (i % 4) + 1) for i, rank in enumerate(ranks)]
+        pips = getScoreNoStarterReference(cards, False)
+        for order in set(permutations(ranks)):
+            rankScores[tuple(rank - 1 for rank in order)] = pips
+
+    hands = np.array(list(combinations(range(52), 4)), dtype=np.int64)
+    rows = sum(np.array(_BINOMIALS[k + 1], dtype=np.int64)[hands[:, k]] for k in range(4))
+    ranks = hands % 13
+    suits = hands // 13
+    flush = np.all(suits == suits[:, :1], axis=1)
+    jackSuits = np.where(ranks == Rank.Jack.value - 1, suits, -1)
+
+    table = np.empty((len(hands), 52), dtype=np.uint8)
+    for starter in range(52):
+        pips = rankScores[ranks[:, 0], ranks[:, 1], ranks[:, 2], ranks[:, 3], starter % 13].astype(np.int64)
+        pips += 4 * flush + (flush & (suits[:, 0] == starter // 13))
+        pips += np.any(jackSuits == starter // 13, axis=1)
+        pips[np.any(hands == starter, axis=1)] = NO_SCORE
+        table[rows, starter] = pips
+
+    if fileName is not None:
+        saveTable(fileName, table)
+    return table
+
+# Scores many hands at once. keeps is an (N,k) array of card ids and starters
+# an (M,) array of card ids; the result is the (N,M) matrix of getScore values
+# for every keep with every starter. Starters should not be cards in the keep.
+def getScoreBatch(keeps, starters):
+    keeps = np.asarray(keeps, dtype=np.intp)
+    starters = np.asarray(starters, dtype=np.intp)
+    return scoreHandArrays(keeps[:, np.newaxis, :], starters[np.newaxis, :])
+
+# Element-wise hand scoring on arrays of card ids. hands has shape (..., k) and
+# starters a shape that broadcasts against hands[..., 0].
+def scoreHandArrays(hands, starters):
+    hands = np.asarray(hands, dtype=np.intp)
+    starters = np.asarray(starters, dtype=np.intp)
+    shape = np.broadcast_shapes(hands.shape[:-1], starters.shape)
+    hands = np.broadcast_to(hands, shape + hands.shape[-1:])
+    starters = np.broadcast_to(starters, shape)
+    cards = np.concatenate([hands, starters[..., np.newaxis]], axis=-1)
+    ranks = CARD_RANKS[cards]
+    suits = CARD_SUITS[cards]
+
+    # Fifteens: sum the values of every subset of two or more cards
+    sums = CARD_VALUES[cards].astype(np.int16) @ _subsetMatrix(cards.shape[-1])
+    pips = 2 * np.count_nonzero(sums == 15, axis=-1)
+
+    # Pairs: n cards of the same rank make n * (n - 1) / 2 pairs
+    counts = (ranks[..., np.newaxis] == _RANKS).sum(axis=-2, dtype=np.int16)
+    pips += (counts * (counts - 1)).sum(axis=-1)
+
+    # Runs: the number of runs of a given length is the product of the rank
+    # counts across each window of consecutive ranks. Only the longest counts.
+    runs = np.zeros(shape, dtype=np.int16)
+    for length in range(min(cards.shape[-1], 5), 2, -1):
+        windows = counts[..., :14 - length].copy()
+        for offset in range(1, length):
+            windows *= counts[..., offset:14 - length + offset]
+        runs = np.where(runs == 0, length * windows.sum(axis=-1, dtype=np.int16), runs)
+    pips += runs
+
+    # Flush: all of the hand's cards share a suit, plus one if the starter does too
+    handSuits = suits[..., :-1]
+    flush = np.all(handSuits == handSuits[..., :1], axis=-1)
+    pips += 4 * flush + (flush & (suits[..., 0] == suits[..., -1]))
+
+    # Nobs: the jack of the starter's suit is in the hand
+    pips += np.any((ranks[..., :-1] == Rank.Jack.value) & (handSuits == suits[..., -1:]), axis=-1)
+    return pips
+
+# Scores of every two card group (rows in the same order as the hand score
+# table, i = C(a,1) + C(b,2)) with every starter. It is small enough to build
+# in memory the first time it is needed.
+def getThrowScoreTable():
+    global _throwScoreTable
+    if _throwScoreTable is None:
+        throws = np.array(sorted(combinations(range(52), 2), key=lambda throw: (throw[1], throw[0])))
+        _throwScoreTable = scoreHandArrays(throws[:, np.newaxis, :], np.arange(52)).astype(np.uint8)
+    return _throwScoreTable
+
+# The row of scores with every starter of a group of two or four sorted card
+# ids, read straight from the precomputed tables. Entries for starters in the
+# group are meaningless. Returns None for other group sizes.
+def starterScoreRow(ids):
+    if len(ids) == 4:
+        return getScoreTable()[_BINOMIALS[1][ids[0]] + _BINOMIALS[2][ids[1]] + _BINOMIALS[3][ids[2]] +
+                               _BINOMIALS[4][ids[3]]]
+    if len(ids) == 2:
+        return getThrowScoreTable()[_BINOMIALS[1][ids[0]] + _BINOMIALS[2][ids[1]]]
+    return None
+
+# Returns the scores of a group of cards with each of the 52 possible starters,
+# indexed by the starter's card id. Starters that are in the group score 0.
+# Results are cached (for the most recently used groups) and shared, so the
+# returned array must not be modified.
+def getStarterScores(cards):
+    return _starterScores(tuple(sorted(card.id for card in cards)))
+
+@lru_cache(maxsize=4096)
+def _starterScores(key):
+    row = starterScoreRow(key)
+    if row is None:
+        scores = getScoreBatch([key], np.arange(52))[0].astype(np.int16)
+    else:
+        scores = row.astype(np.int16)
+    scores[list(key)] = 0
+    scores.flags.writeable = False
+    return scores
+
+_RANKS = np.arange(1, 14, dtype=np.int8)
+_subsetMatrices = {}
+
+# Returns a (numCards, numSubsets) 0/1 matrix with one column for each subset of
+# at least two cards
+def _subsetMatrix(numCards):
+    if numCards not in _subsetMatrices:
+        columns = [[int(i in subset) for i in range(numCards)]
+                   for size in range(2, numCards + 1) for subset in combinations(range(numCards), size)]
+        _subsetMatrices[numCards] = np.array(columns, dtype=np.int16).T
+    return _subsetMatrices[numCards]
+
+# The original scoring routine, which enumerates every combination of cards
+def getScoreReference(hand, starter, verbose):
     pips = 0
     # Check scoring where the starter card matters
     pips += checkNobs(hand, starter, verbose)
@@ -42,6 +396,13 @@ def getScore(hand, starter, verbose):
     return pips
 
 def getScoreNoStarter(hand, verbose):
+    breakdown = scoreBreakdown(hand)
+    if verbose:
+        print(breakdown)
+    return breakdown.total()
+
+# The original scoring routine for hands without a starter
+def getScoreNoStarterReference(hand, verbose):
     pips = 0
     pips += checkPairs(hand, verbose)
     for numCards in range(2, len(hand) + 1):
@@ -79,12 +440,12 @@ def checkSum(cards, goal, verbose):
 
 def checkRuns(hand, verbose):
     pips = 0
-    hand.sort(key=lambda card: card.rank.value)
+    hand = sorted(hand, key=lambda card: card.rankValue)
     # check for runs starting with 5
     for i in range(5, 2, -1):
         runFound = False
         for combination in combinations(hand, i):
-            if all([x.rank.value - y.rank.value == 1 for x, y in zip(combination[1:], combination[:-1])]):
+            if all([x.rankValue - y.rankValue == 1 for x, y in zip(combination[1:], combination[:-1])]):
                 if verbose:
                     print("\tRun for " + str(i) + "! " + cardsString(combination))
                 pips += i
@@ -111,7 +472,142 @@ def checkFlush(hand, starter, verbose):
     return pips
 
 
-# These functions score the count during pegging.
+# The cards played since the count was last reset, kept so that the points
+# for playing another card can be found without rescanning the whole count.
+# Only the count, the ranks played and the number of trailing cards of the
+# same rank are needed, so each new card is scored in constant time (a run
+# can't be longer than the 13 ranks).
+class PeggingSequence:
+    __slots__ = ('cards', 'ranks', 'count', 'sameRank')
+
+    def __init__(self, cards=()):
+        self.reset()
+        for card in cards:
+            self.play(card)
+
+    def reset(self):
+        self.cards = []
+        self.ranks = []
+        self.count = 0
+        self.sameRank = 0
+
+    def copy(self):
+        sequence = PeggingSequence.__new__(PeggingSequence)
+        sequence.cards = list(self.cards)
+        sequence.ranks = list(self.ranks)
+        sequence.count = self.count
+        sequence.sameRank = self.sameRank
+        return sequence
+
+    def __len__(self):
+        return len(self.cards)
+
+    # True if the card can be played without going over 31
+    def canPlay(self, card):
+        return self.count + card.pips <= 31
+
+    # Returns the points for the count, pairs and runs made by playing a card,
+    # without playing it
+    def scoreParts(self, card):
+        count = self.count + card.pips
+        countPips = 2 if (count == 15 or count == 31) else 0
+
+        rank = card.rankValue
+        ranks = self.ranks
+        sameRank = self.sameRank + 1 if (ranks and ranks[-1] == rank) else 1
+        sameRank = min(sameRank, 4)
+        pairPips = sameRank * (sameRank - 1)
+
+        # Look back over the played cards for the longest run ending with this
+        # card. A repeated rank ends the search since no longer run can hold it.
+        runPips = 0
+        seen = 1 << rank
+        low = high = rank
+        length = 1
+        for i in range(len(ranks) - 1, -1, -1):
+            other = ranks[i]
+            if (seen >> other) & 1:
+                break
+            seen |= 1 << other
+            length += 1
+            if other < low:
+                low = other
+            elif other > high:
+                high = other
+            if length >= 3 and high - low == length - 1:
+                runPips = length
+
+        return countPips, pairPips, runPips
+
+    # Returns the points that playing a card would score
+    def score(self, card):
+        countPips, pairPips, runPips = self.scoreParts(card)
+        return countPips + pairPips + runPips
+
+    # Plays a card and returns the points it scores
+    def play(self, card, verbose=False):
+        countPips, pairPips, runPips = self.scoreParts(card)
+        ranks = self.ranks
+        if ranks and ranks[-1] == card.rankValue:
+            self.sameRank += 1
+        else:
+            self.sameRank = 1
+        self.cards.append(card)
+        ranks.append(card.rankValue)
+        self.count += card.pips
+
+        if verbose:
+            if countPips > 0:
+                print("\t" + str(self.count) + " for 2! " + cardsString(self.cards))
+            if runPips > 0:
+                print("That's a run of {}!".format(runPips))
+            if pairPips > 0:
+                print("That's {} pair!".format(int(pairPips / 2)))
+
+        return countPips + pairPips + runPips
+
+# A read-only view of a PeggingSequence, given to players so that they can
+# score candidate plays on the engine's count without being able to change it.
+# copy returns an ordinary PeggingSequence that can be played on.
+class PeggingView:
+    __slots__ = ('_sequence',)
+
+    def __init__(self, sequence):
+        self._sequence = sequence
+
+    @property
+    def cards(self):
+        return tuple(self._sequence.cards)
+
+    @property
+    def ranks(self):
+        return tuple(self._sequence.ranks)
+
+    @property
+    def count(self):
+        return self._sequence.count
+
+    @property
+    def sameRank(self):
+        return self._sequence.sameRank
+
+    def copy(self):
+        return self._sequence.copy()
+
+    def __len__(self):
+        return len(self._sequence.cards)
+
+    def canPlay(self, card):
+        return self._sequence.canPlay(card)
+
+    def scoreParts(self, card):
+        return self._sequence.scoreParts(card)
+
+    def score(self, card):
+        return self._sequence.score(card)
+
+# These functions score the count during pegging. scoreCards rescans the whole
+# count and is kept as the reference for PeggingSequence.
 def scoreCards(countCards, verbose):
     pips = 0
     run = 0
@@ -142,15 +638,15 @@ def scoreCards(countCards, verbose):
 
 def scoreRun(cards):
     pips = 0
-    cards.sort(key=lambda card: card.rank.value)
-    if all([x.rank.value - y.rank.value == 1 for x, y in zip(cards[1:], cards[:-1])]):
+    cards = sorted(cards, key=lambda card: card.rankValue)
+    if all([x.rankValue - y.rankValue == 1 for x, y in zip(cards[1:], cards[:-1])]):
         pips = len(cards)
 
     return pips
 
 def scorePairs(cards):
     pips = 0
-    if all([x.rank.value - y.rank.value == 0 for x, y in zip(cards[1:], cards[:-1])]):
+    if all([x.rankValue - y.rankValue == 0 for x, y in zip(cards[1:], cards[:-1])]):
         pips = len(cards) * (len(cards) - 1)
 
     return pips
\ No newline at end of file
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+################################################################################
+#
+# File : Seeds.py
+# Authors : Kjartan, Tristan
+#
+# Description : Derives independent random number streams for games, hands and
+#               players from a single master seed.
+#
+# Notes : Every seed is computed directly from the master seed and the position
+#         it is for (stream, game, hand, player) using numpy's SeedSequence, so
+#         any one hand of a long run can be dealt and played again without
+#         replaying the hands before it. Streams for different positions are
+#         statistically independent.
+#
+# Dependencies:
+#    - numpy (third party library)
+#    - random (standard python library)
+#
+################################################################################
+
+import numpy as np
+import random
+
+# The kinds of streams that are derived from the master seed
+DECK_STREAM = 0
+ENGINE_STREAM = 1
+PLAYER_STREAM = 2
+GLOBAL_STREAM = 3
+
+class SeedRegistry:
+    def __init__(self, masterSeed=None):
+        if masterSeed is None:
+            masterSeed = random.getrandbits(63)
+        self.masterSeed = masterSeed
+
+    # Returns a 64-bit seed for the given position
+    def derive(self, *position):
+        words = np.random.SeedSequence(self.masterSeed, spawn_key=position).generate_state(2, np.uint32)
+        return (int(words[0]) << 32) | int(words[1])
+
+    # Seed for the engine at the start of a game
+    def gameSeed(self, game=0):
+        return self.derive(ENGINE_STREAM, game)
+
+    # Seed for the shuffles and cuts of a hand's deck
+    def deckSeed(self, hand, game=0):
+        return self.derive(DECK_STREAM, game, hand)
+
+    # Seed for the engine's own choices during a hand
+    def engineSeed(self, hand, game=0):
+        return self.derive(ENGINE_STREAM, game, hand)
+
+    # Seed for a player's decisions during a hand. player is the player's number.
+    def playerSeed(self, player, hand, game=0):
+        return self.derive(PLAYER_STREAM, game, hand, player)
+
+    # Seed for the global random and numpy.random modules during a hand, for
+    # players that don't use their own generator
+    def globalSeed(self, hand, game=0):
+        return self.derive(GLOBAL_STREAM, game, hand)
+
+    # Seeds everything used to play a hand: the deck, the engine, the players
+    # and, if seedGlobals is set, the global generators. Games played in
+    # threads of the same process share the global generators, so they must
+    # leave them alone.
+    def seedHand(self, deck, engine, players, hand, game=0, seedGlobals=True):
+        if deck is not None:
+            deck.seed(self.deckSeed(hand, game))
+        if engine is not None:
+            engine.RNG.seed(self.engineSeed(hand, game))
+        for player in players:
+            player.seed(self.playerSeed(player.number, hand, game))
+        if seedGlobals:
+            globalSeed = self.globalSeed(hand, game)
+            random.seed(globalSeed)
+            np.random.seed(globalSeed % 2**32)
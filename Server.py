@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+
+################################################################################
+#
+# File : Server.py
+# Authors : Kjartan, Tristan
+#
+# Description : An asyncio server that hosts many games of cribbage at once,
+#               each between a remote player and a bot, over TCP or a Unix
+#               socket.
+#
+# Notes : Messages are JSON objects, one per line. Cards are card ids (see
+#         Deck.py). A client opens a table with
+#             {"type": "join", "name": ..., "opponent": "Myrmidon", "seed": 1}
+#         and is answered with {"type": "joined", "table": ..., "player": 1}.
+#         The server then asks for decisions with
+#             {"type": "throw", "hand": [...], "numCards": 2, "state": {...}}
+#             {"type": "play", "hand": [...], "state": {...}}
+#         which are answered with {"type": "throw", "cards": [...]} and
+#         {"type": "play", "card": id or null}. An illegal answer, or one that
+#         isn't a JSON object, gets an {"type": "error"} message and the
+#         request is sent again. When the game ends the server sends
+#         {"type": "gameOver", "scores": [...]} and closes the connection. A
+#         client that doesn't answer within the timeout forfeits: it is sent
+#         {"type": "gameOver", "scores": [...], "forfeit": "timeout"} with the
+#         scores so far. If the table fails for any other reason the forfeit
+#         is "error".
+#
+#         The Cribbage engine is synchronous, so each table plays in a thread
+#         of an executor, and the event loop only moves messages. A
+#         RemotePlayer's decisions wait on a future that the event loop
+#         completes when the client's answer arrives.
+#
+#         Bots don't run in the table's thread, where they would hold the GIL
+#         that the event loop and every other table share while they think.
+#         Each bot lives in one of the server's worker processes (one per CPU
+#         by default, each a single process executor, so a table's bot always
+#         stays in the same one), and the table plays against a WorkerBot that
+#         forwards the bot's Player methods to it, along with the hand,
+#         playhand and pips the engine changes. A slow bot only holds up the
+#         tables whose bots share its worker.
+#
+#         Seeded tables seed the deck, the engine and the players but not the
+#         global random generators, which are shared by every bot in a worker.
+#         Bots that draw from the global generators aren't reproducible here.
+#
+#         Usage:
+#           python Server.py serve [--host 127.0.0.1] [--port 8765] [--unix path]
+#           python Server.py loadtest [--tables 200] [--opponent Random] [--port 8765]
+#
+#         loadtest starts a server and plays the given number of tables against
+#         it at once with clients that make random legal decisions.
+#
+# Dependencies:
+#    - Cribbage.py (in local project)
+#    - Player.py (in local project)
+#    - Deck.py (in local project)
+#    - DiscardTable.py (in local project)
+#    - Myrmidon.py (in local project)
+#    - Player_AI.py (in local project)
+#    - PlayerRandom.py (in local project)
+#    - PlayerExpectimax.py (in local project)
+#    - PlayerDiscardTable.py (in local project)
+#    - asyncio, argparse, concurrent.futures, itertools, json, os, random,
+#      time (standard python library)
+#
+################################################################################
+
+# Cribbage imports
+from Cribbage import Cribbage
+from Player import Player
+from Deck import CARDS
+from DiscardTable import prebuildTables
+
+# Player imports
+from Myrmidon import Myrmidon
+from Player_AI import Player_AI
+from PlayerRandom import PlayerRandom
+from PlayerExpectimax import PlayerExpectimax
+from PlayerDiscardTable import PlayerDiscardTable
+
+# Utility imports
+import asyncio
+import argparse
+import concurrent.futures
+import itertools
+import json
+import os
+import random
+import time
+
+# The bots a client can play against, by name
+BOTS = {
+    'Random': lambda number: PlayerRandom(number, False),
+    'Myrmidon': lambda number: Myrmidon(number, 5, False),
+    'AI': lambda number: Player_AI(number, False),
+    'Expectimax': lambda number: PlayerExpectimax(number, False),
+    'DiscardTable': lambda number: PlayerDiscardTable(number, False),
+}
+
+# The parts of the game state sent to clients, with cards as ids
+def stateMessage(gameState):
+    return {'scores': list(gameState['scores']), 'numCards': list(gameState['numCards']),
+            'inplay': [card.id for card in gameState['inplay']],
+            'playorder': [card.id for card in gameState['playorder']], 'dealer': gameState['dealer'],
+            'starter': None if gameState['starter'] is None else gameState['starter'].id,
+            'count': gameState['count']}
+
+# Raised in a table's thread when its client takes too long to answer
+class ClientTimeout(ConnectionError):
+    pass
+
+# A client's connection, used from both the event loop and the table's thread
+class Connection:
+    def __init__(self, loop, writer, timeout):
+        self.loop = loop
+        self.writer = writer
+        self.timeout = timeout
+        self.pending = None
+        self.closed = False
+
+    # Sends a message. Safe to call from any thread; from the event loop it is
+    # written at once, so it can't be left behind when the connection closes.
+    def send(self, message):
+        data = (json.dumps(message) + "\n").encode()
+        if self.onLoop():
+            self.writer.write(data)
+        else:
+            self.loop.call_soon_threadsafe(self.writer.write, data)
+
+    def onLoop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    # Sends a request and waits for the answer. Called from the table's thread.
+    def request(self, message):
+        if self.closed:
+            raise ConnectionError("The client has disconnected")
+        self.pending = concurrent.futures.Future()
+        self.send(message)
+        try:
+            return self.pending.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            raise ClientTimeout("The client didn't answer within {} seconds".format(self.timeout))
+
+    # Passes an answer from the client to the waiting table. Called from the
+    # event loop.
+    def answer(self, message):
+        if self.pending is not None and not self.pending.done():
+            self.pending.set_result(message)
+
+    def close(self):
+        self.closed = True
+        if self.pending is not None and not self.pending.done():
+            self.pending.set_exception(ConnectionError("The client has disconnected"))
+
+# A player whose decisions are made by a client
+class RemotePlayer(Player):
+
+    def __init__(self, number, name, connection):
+        super().__init__(number)
+        self.name = name
+        self.connection = connection
+
+    def throwCribCards(self, numCards, gameState):
+        ids = [card.id for card in self.hand]
+        while True:
+            answer = self.connection.request({'type': 'throw', 'hand': ids, 'numCards': numCards,
+                                              'state': stateMessage(gameState)})
+            cards = answer.get('cards') if isinstance(answer, dict) else None
+            if (isinstance(cards, list) and all(isinstance(card, int) for card in cards) and
+                    len(cards) == numCards and len(set(cards)) == numCards and all(card in ids for card in cards)):
+                break
+            self.connection.send({'type': 'error', 'message': "Throw {} cards from your hand".format(numCards)})
+
+        cribCards = [CARDS[card] for card in cards]
+        self.hand = [card for card in self.hand if card not in cribCards]
+        super().createPlayHand()
+        return cribCards
+
+    def playCard(self, gameState):
+        count = gameState['count']
+        ids = [card.id for card in self.playhand]
+        legal = [card.id for card in self.playhand if count + card.value() <= 31]
+        while True:
+            answer = self.connection.request({'type': 'play', 'hand': ids, 'state': stateMessage(gameState)})
+            if isinstance(answer, dict):
+                card = answer.get('card')
+                if card in legal or (card is None and len(legal) == 0):
+                    break
+            self.connection.send({'type': 'error', 'message': "Play a card that keeps the count at 31 or less, "
+                                                              "or null if there is none"})
+
+        if card is None:
+            return None
+        playedCard = CARDS[card]
+        self.playhand.remove(playedCard)
+        return playedCard
+
+    def explainThrow(self):
+        pass
+
+    def explainPlay(self):
+        pass
+
+    def learnFromHandScores(self, scores, gameState):
+        pass
+
+    def learnFromPegging(self, gameState):
+        pass
+
+# The Player methods with default versions that a WorkerBot has its bot make,
+# if the bot's class overrides them. The defaults only touch the fields copied
+# with every call, so they are run where the table is. The abstract methods
+# are always made by the bot.
+BOT_METHODS = ('newGame', 'reset', 'endOfGame', 'thirtyOne', 'go')
+
+# The bots hosted by a worker process, by table id
+_bots = {}
+
+# Creates the bot for a table in a worker process. Returns its name and the
+# methods of BOT_METHODS its class overrides.
+def createBot(tableId, opponent, number):
+    bot = BOTS[opponent](number)
+    _bots[tableId] = bot
+    return bot.name, [method for method in BOT_METHODS if getattr(type(bot), method) is not getattr(Player, method)]
+
+# Calls a method of a table's bot in a worker process, after bringing the
+# fields the engine changes up to date. Returns the result and those fields.
+def callBot(tableId, method, args, fields):
+    bot = _bots[tableId]
+    bot.hand, bot.playhand, bot.pips = fields
+    result = getattr(bot, method)(*args)
+    return result, (bot.hand, bot.playhand, bot.pips)
+
+def removeBot(tableId):
+    _bots.pop(tableId, None)
+
+# A bot that lives in one of the server's worker processes. The engine plays
+# against this player, which calls the bot's methods in the worker: the
+# abstract ones always, and those of BOT_METHODS the bot overrides by
+# replacing them on the instance (as Instrumentation.py patches players). The
+# hand, playhand and pips are copied both ways around each call.
+class WorkerBot(Player):
+
+    def __init__(self, number, opponent, tableId, worker):
+        super().__init__(number)
+        self.tableId = tableId
+        self.worker = worker
+        self.name, methods = worker.submit(createBot, tableId, opponent, number).result()
+        for method in methods:
+            setattr(self, method, self.forwarder(method))
+
+    def forwarder(self, method):
+        def forward(*args):
+            return self.call(method, *args)
+        return forward
+
+    def call(self, method, *args):
+        result, fields = self.worker.submit(callBot, self.tableId, method, args,
+                                            (self.hand, self.playhand, self.pips)).result()
+        self.hand, self.playhand, self.pips = fields
+        return result
+
+    # The bot draws from its own generator, so that is the one seeded
+    def seed(self, seed):
+        self.call('seed', seed)
+
+    def throwCribCards(self, numCards, gameState):
+        return self.call('throwCribCards', numCards, gameState)
+
+    def playCard(self, gameState):
+        return self.call('playCard', gameState)
+
+    def explainThrow(self):
+        self.call('explainThrow')
+
+    def explainPlay(self):
+        self.call('explainPlay')
+
+    def learnFromHandScores(self, scores, gameState):
+        self.call('learnFromHandScores', scores, gameState)
+
+    def learnFromPegging(self, gameState):
+        self.call('learnFromPegging', gameState)
+
+    # Lets the worker forget the bot once its table is over
+    def close(self):
+        try:
+            self.worker.submit(removeBot, self.tableId)
+        except RuntimeError:
+            pass
+
+# Plays a whole game at a table. Runs in one of the server's threads.
+def playTable(players, seed):
+    game = Cribbage(players, None, False, False, seed, seedGlobals=False)
+    game.playGame()
+    return [player.pips for player in players]
+
+class CribbageServer:
+    def __init__(self, maxTables=256, timeout=300, numWorkers=None):
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=maxTables)
+        # Each worker reseeds the global generators it inherits, so that
+        # workers don't all draw the same numbers
+        self.workers = [concurrent.futures.ProcessPoolExecutor(max_workers=1, initializer=random.seed)
+                        for _ in range(numWorkers or os.cpu_count() or 1)]
+        self.timeout = timeout
+        self.tableIds = itertools.count(1)
+        self.activeTables = 0
+        self.gamesPlayed = 0
+        self.forfeits = 0
+        self.server = None
+
+    # Starts listening, once the precomputed tables are ready so that no table
+    # waits for them to be built. Every worker loads them, which also starts
+    # the worker processes before any table's thread is running.
+    async def start(self, host='127.0.0.1', port=8765, unixPath=None):
+        for worker in self.workers:
+            await asyncio.get_running_loop().run_in_executor(worker, prebuildTables)
+        if unixPath is not None:
+            self.server = await asyncio.start_unix_server(self.handleClient, path=unixPath)
+        else:
+            self.server = await asyncio.start_server(self.handleClient, host, port)
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=False)
+        for worker in self.workers:
+            worker.shutdown(wait=False, cancel_futures=True)
+
+    async def handleClient(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        connection = Connection(loop, writer, self.timeout)
+        joined = False
+        bot = None
+        try:
+            line = await reader.readline()
+            join = json.loads(line) if line else {}
+            if not isinstance(join, dict):
+                join = {}
+            opponent = join.get('opponent', 'Myrmidon')
+            if join.get('type') != 'join' or opponent not in BOTS:
+                writer.write((json.dumps({'type': 'error', 'message': "Join a table with one of the opponents "
+                                          "{}".format(sorted(BOTS))}) + "\n").encode())
+                return
+
+            tableId = next(self.tableIds)
+            worker = self.workers[tableId % len(self.workers)]
+            bot = await loop.run_in_executor(self.executor, WorkerBot, 2, opponent, tableId, worker)
+            players = [RemotePlayer(1, join.get('name', 'Remote'), connection), bot]
+            connection.send({'type': 'joined', 'table': tableId, 'player': 1})
+            self.activeTables += 1
+            joined = True
+            table = loop.run_in_executor(self.executor, playTable, players, join.get('seed'))
+
+            # Pass answers to the table until the game is over
+            reading = asyncio.ensure_future(reader.readline())
+            while True:
+                done, _ = await asyncio.wait({table, reading}, return_when=asyncio.FIRST_COMPLETED)
+                if reading in done:
+                    line = reading.result()
+                    if not line:
+                        connection.close()
+                        await asyncio.gather(table, return_exceptions=True)
+                        break
+                    try:
+                        connection.answer(json.loads(line))
+                    except json.JSONDecodeError:
+                        connection.send({'type': 'error', 'message': "Messages must be JSON"})
+                        connection.answer({})
+                    reading = asyncio.ensure_future(reader.readline())
+                if table in done:
+                    reading.cancel()
+                    error = table.exception()
+                    if error is None:
+                        self.gamesPlayed += 1
+                        connection.send({'type': 'gameOver', 'scores': table.result()})
+                    else:
+                        self.forfeits += 1
+                        connection.send({'type': 'gameOver', 'scores': [player.pips for player in players],
+                                         'forfeit': 'timeout' if isinstance(error, ClientTimeout) else 'error'})
+                    break
+        except (ConnectionError, json.JSONDecodeError):
+            pass
+        finally:
+            if joined:
+                self.activeTables -= 1
+            if bot is not None:
+                bot.close()
+            connection.close()
+            try:
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+# A client that plays one game with random legal decisions. Returns the final
+# scores.
+async def randomClient(host, port, unixPath=None, opponent='Random', seed=None):
+    if unixPath is not None:
+        reader, writer = await asyncio.open_unix_connection(unixPath)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    RNG = random.Random(seed)
+    writer.write((json.dumps({'type': 'join', 'name': 'LoadTest', 'opponent': opponent, 'seed': seed}) +
+                  "\n").encode())
+    scores = None
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        message = json.loads(line)
+        if message['type'] == 'throw':
+            answer = {'type': 'throw', 'cards': RNG.sample(message['hand'], message['numCards'])}
+        elif message['type'] == 'play':
+            count = message['state']['count']
+            legal = [card for card in message['hand'] if count + CARDS[card].value() <= 31]
+            answer = {'type': 'play', 'card': RNG.choice(legal) if legal else None}
+        elif message['type'] == 'gameOver':
+            scores = message['scores']
+            break
+        else:
+            continue
+        writer.write((json.dumps(answer) + "\n").encode())
+    writer.close()
+    return scores
+
+# Plays numTables games at once against a server started here and reports the
+# throughput
+async def loadTest(numTables, host='127.0.0.1', port=8765, unixPath=None, opponent='Random'):
+    server = CribbageServer(maxTables=numTables)
+    await server.start(host, port, unixPath)
+    start = time.perf_counter()
+    results = await asyncio.gather(*[randomClient(host, port, unixPath, opponent, seed)
+                                     for seed in range(numTables)], return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    await server.close()
+    finished = [result for result in results if isinstance(result, list)]
+    print("Played {} of {} tables against {} in {:.2f}s ({:.1f} games/s)".format(
+        len(finished), numTables, opponent, elapsed, len(finished) / elapsed))
+    return finished
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Cribbage game server")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help="host games until interrupted")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--unix', help="listen on a Unix socket at this path instead")
+    serve.add_argument('--tables', type=int, default=256, help="most tables played at once")
+    test = commands.add_parser('loadtest', help="play many tables at once against a local server")
+    test.add_argument('--host', default='127.0.0.1')
+    test.add_argument('--port', type=int, default=8765)
+    test.add_argument('--unix')
+    test.add_argument('--tables', type=int, default=200)
+    test.add_argument('--opponent', choices=sorted(BOTS), default='Random')
+    arguments = parser.parse_args(arguments)
+
+    if arguments.command == 'loadtest':
+        asyncio.run(loadTest(arguments.tables, arguments.host, arguments.port, arguments.unix,
+                             arguments.opponent))
+        return
+
+    async def serveForever():
+        server = CribbageServer(maxTables=arguments.tables)
+        listener = await server.start(arguments.host, arguments.port, arguments.unix)
+        print("Serving cribbage on {}".format(arguments.unix or "{}:{}".format(arguments.host, arguments.port)))
+        async with listener:
+            await listener.serve_forever()
+
+    asyncio.run(serveForever())
+
+if __name__ == '__main__':
+    main()
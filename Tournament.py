@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+
+################################################################################
+#
+# File : Tournament.py
+# Authors : Kjartan, Tristan
+#
+# Description : Plays tournaments of whole games between any number of players,
+#               paired round-robin or Swiss, and rates them with Elo and Glicko.
+#
+# Notes : Players are given as a registry of factories: callables that take a
+#         player number and return a new player. They are sent to worker
+#         processes, so they must be picklable (classes, or functools.partial
+#         of classes, rather than lambdas). PLAYERS is the default registry.
+#
+#         Every match is played on the same deal stream. Game g of every match
+#         uses the seed SeedRegistry(seed).gameSeed(g) for its engine, and is
+#         played twice with the players swapping seats, so each player gets
+#         the other's cards. Luck of the deal then mostly cancels within a
+#         match and is the same for every pairing, so ratings settle with far
+#         fewer games.
+#
+#         The matches of a round are played in a pool of processes. Ratings
+#         are updated once the round is over, in the order the matches were
+#         scheduled, so results don't depend on the number of workers. Elo is
+#         updated after each game; Glicko treats each round as a rating period.
+#
+#         Swiss rounds pair players with close ratings who haven't met yet. With
+#         an odd number of players the lowest rated player without a bye sits
+#         the round out.
+#
+#         Usage:
+#           python Tournament.py [--players Random Myrmidon AI] [--format swiss]
+#                                [--rounds 3] [--games 10] [--workers 4] [--seed 1]
+#
+# Dependencies:
+#    - Cribbage.py (in local project)
+#    - Seeds.py (in local project)
+#    - DiscardTable.py (in local project)
+#    - Myrmidon.py (in local project)
+#    - Player_AI.py (in local project)
+#    - PlayerRandom.py (in local project)
+#    - PlayerExpectimax.py (in local project)
+#    - PlayerDiscardTable.py (in local project)
+#    - argparse, concurrent.futures, contextlib, functools, math, os, random
+#      (standard python library)
+#
+################################################################################
+
+# Cribbage imports
+from Cribbage import Cribbage
+from Seeds import SeedRegistry
+from DiscardTable import prebuildTables
+
+# Player imports
+from Myrmidon import Myrmidon
+from Player_AI import Player_AI
+from PlayerRandom import PlayerRandom
+from PlayerExpectimax import PlayerExpectimax
+from PlayerDiscardTable import PlayerDiscardTable
+
+# Utility imports
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+from functools import partial
+import math
+import os
+import random
+
+# The players that can be entered, by name
+PLAYERS = {
+    'Random': partial(PlayerRandom, verboseFlag=False),
+    'Myrmidon': partial(Myrmidon, numSims=5, verboseFlag=False),
+    'AI': partial(Player_AI, verboseFlag=False),
+    'Expectimax': partial(PlayerExpectimax, verboseFlag=False),
+    'DiscardTable': partial(PlayerDiscardTable, verboseFlag=False),
+}
+
+ROUND_ROBIN = 'roundRobin'
+SWISS = 'swiss'
+
+class EloRating:
+    def __init__(self, initial=1500.0, kFactor=16.0):
+        self.initial = initial
+        self.kFactor = kFactor
+        self.ratings = {}
+
+    def rating(self, name):
+        return self.ratings.get(name, self.initial)
+
+    def expected(self, first, second):
+        return 1 / (1 + 10 ** ((self.rating(second) - self.rating(first)) / 400))
+
+    # score is 1 if first won, 0 if second won
+    def update(self, first, second, score):
+        change = self.kFactor * (score - self.expected(first, second))
+        self.ratings[first] = self.rating(first) + change
+        self.ratings[second] = self.rating(second) - change
+
+# Glicko ratings (Glickman's original system). Each player has a rating and a
+# rating deviation (RD) that shrinks as they play and grows by drift each
+# period they don't.
+class GlickoRating:
+    Q = math.log(10) / 400
+
+    def __init__(self, initial=1500.0, initialDeviation=350.0, drift=30.0):
+        self.initial = initial
+        self.initialDeviation = initialDeviation
+        self.drift = drift
+        self.ratings = {}
+        self.deviations = {}
+
+    def rating(self, name):
+        return self.ratings.get(name, self.initial)
+
+    def deviation(self, name):
+        return self.deviations.get(name, self.initialDeviation)
+
+    @staticmethod
+    def g(deviation):
+        return 1 / math.sqrt(1 + 3 * (GlickoRating.Q * deviation / math.pi) ** 2)
+
+    # The chance that first beats second
+    def expected(self, first, second):
+        return 1 / (1 + 10 ** (-self.g(self.deviation(second)) * (self.rating(first) - self.rating(second)) / 400))
+
+    # Updates every player from the games of one rating period, a list of
+    # (first, second, score) with score 1 if first won and 0 if second won
+    def updatePeriod(self, games, players):
+        outcomes = {name: [] for name in players}
+        for first, second, score in games:
+            outcomes[first].append((second, score))
+            outcomes[second].append((first, 1 - score))
+
+        ratings = {}
+        deviations = {}
+        for name, games in outcomes.items():
+            deviation = min(math.sqrt(self.deviation(name) ** 2 + self.drift ** 2), self.initialDeviation)
+            if not games:
+                ratings[name] = self.rating(name)
+                deviations[name] = deviation
+                continue
+            variance = 0.0
+            improvement = 0.0
+            for opponent, score in games:
+                g = self.g(self.deviation(opponent))
+                expected = self.expected(name, opponent)
+                variance += g * g * expected * (1 - expected)
+                improvement += g * (score - expected)
+            precision = 1 / deviation ** 2 + GlickoRating.Q ** 2 * variance
+            ratings[name] = self.rating(name) + GlickoRating.Q / precision * improvement
+            deviations[name] = math.sqrt(1 / precision)
+        self.ratings.update(ratings)
+        self.deviations.update(deviations)
+
+# The rounds of a round robin, by the circle method. Each round is a list of
+# pairs; with an odd number of players one sits out each round.
+def roundRobinRounds(names):
+    names = list(names)
+    if len(names) % 2:
+        names.append(None)
+    rounds = []
+    for i in range(len(names) - 1):
+        pairs = [(names[j], names[-1 - j]) for j in range(len(names) // 2)]
+        # Alternate who is listed first so seats even out
+        pairs = [pair if (i + j) % 2 == 0 else pair[::-1] for j, pair in enumerate(pairs)]
+        rounds.append([pair for pair in pairs if None not in pair])
+        names = [names[0], names[-1]] + names[1:-1]
+    return rounds
+
+# Pairs players for a Swiss round. Players are taken in order of rating, and
+# each is paired with the next highest rated player it hasn't met, or with the
+# next one if it has met them all. Returns the pairs and the player with the
+# bye, if any.
+def swissPairs(names, rating, played, byes=()):
+    ranked = sorted(names, key=lambda name: (-rating(name), name))
+    bye = None
+    if len(ranked) % 2:
+        bye = next((name for name in reversed(ranked) if name not in byes), ranked[-1])
+        ranked.remove(bye)
+
+    pairs = []
+    while ranked:
+        first = ranked.pop(0)
+        second = next((name for name in ranked if frozenset((first, name)) not in played), ranked[0])
+        ranked.remove(second)
+        pairs.append((first, second))
+    return pairs, bye
+
+# Plays a match in a worker process. Each game seed is played twice, with the
+# players swapping seats. Returns, for each game, 1 if first won and 0 if
+# second did, and the point differential from first's side. Anything the
+# players print is discarded.
+def playMatch(registry, first, second, gameSeeds):
+    results = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for gameSeed in gameSeeds:
+            for seats in ((first, second), (second, first)):
+                players = [registry[seats[0]](1), registry[seats[1]](2)]
+                differential = Cribbage(players, None, False, False, gameSeed).playGame()
+                if seats[0] != first:
+                    differential = -differential
+                results.append((1 if differential > 0 else 0, differential))
+    return results
+
+class Tournament:
+    def __init__(self, registry=PLAYERS, names=None, format=ROUND_ROBIN, gamesPerMatch=10, numRounds=None,
+                 numWorkers=1, seed=None):
+        if format not in (ROUND_ROBIN, SWISS):
+            raise ValueError("The format must be '{}' or '{}'".format(ROUND_ROBIN, SWISS))
+        self.registry = registry
+        self.names = list(registry) if names is None else list(names)
+        if len(self.names) < 2:
+            raise ValueError("A tournament needs at least two players")
+        self.format = format
+        self.gamesPerMatch = gamesPerMatch
+        if numRounds is None:
+            numRounds = len(self.names) - 1 + len(self.names) % 2 if format == ROUND_ROBIN else \
+                math.ceil(math.log2(len(self.names)))
+        self.numRounds = numRounds
+        self.numWorkers = numWorkers
+        if seed is None:
+            seed = random.randrange(2**32)
+        self.seeds = SeedRegistry(seed)
+        # The deal stream every match is played on
+        self.gameSeeds = [self.seeds.gameSeed(game) for game in range(gamesPerMatch)]
+
+        self.elo = EloRating()
+        self.glicko = GlickoRating()
+        self.stats = {name: {'games': 0, 'wins': 0, 'points': 0} for name in self.names}
+        self.played = set()
+        self.byes = set()
+        self.matches = []
+
+    # The pairs for the given round (from 0)
+    def pairings(self, roundNumber):
+        if self.format == ROUND_ROBIN:
+            rounds = roundRobinRounds(self.names)
+            return rounds[roundNumber % len(rounds)]
+        pairs, bye = swissPairs(self.names, self.elo.rating, self.played, self.byes)
+        if bye is not None:
+            self.byes.add(bye)
+        return pairs
+
+    # Plays the matches of a list of pairs, in the pool if there is one
+    def playMatches(self, pairs, executor=None):
+        if executor is None:
+            return [playMatch(self.registry, first, second, self.gameSeeds) for first, second in pairs]
+        futures = [executor.submit(playMatch, self.registry, first, second, self.gameSeeds)
+                   for first, second in pairs]
+        return [future.result() for future in futures]
+
+    def recordMatch(self, roundNumber, first, second, results):
+        self.played.add(frozenset((first, second)))
+        games = []
+        for score, differential in results:
+            self.elo.update(first, second, score)
+            games.append((first, second, score))
+            for name, won, points in ((first, score, differential), (second, 1 - score, -differential)):
+                self.stats[name]['games'] += 1
+                self.stats[name]['wins'] += won
+                self.stats[name]['points'] += points
+        self.matches.append({'round': roundNumber, 'first': first, 'second': second,
+                             'wins': sum(score for score, differential in results), 'games': len(results)})
+        return games
+
+    def playRound(self, roundNumber, executor=None):
+        pairs = self.pairings(roundNumber)
+        periodGames = []
+        for (first, second), results in zip(pairs, self.playMatches(pairs, executor)):
+            periodGames.extend(self.recordMatch(roundNumber, first, second, results))
+        self.glicko.updatePeriod(periodGames, self.names)
+        return pairs
+
+    # Plays every round and returns the final standings
+    def run(self, verbose=True):
+        # Build the tables the players use once, before the workers need them
+        prebuildTables()
+        if self.numWorkers > 1:
+            with ProcessPoolExecutor(max_workers=self.numWorkers) as executor:
+                self.playRounds(executor, verbose)
+        else:
+            self.playRounds(None, verbose)
+        return self.standings()
+
+    def playRounds(self, executor, verbose):
+        for roundNumber in range(self.numRounds):
+            pairs = self.playRound(roundNumber, executor)
+            if verbose:
+                print("Round {}: ".format(roundNumber + 1) + ", ".join(
+                    "{} {}-{} {}".format(match['first'], match['wins'], match['games'] - match['wins'],
+                                         match['second']) for match in self.matches[-len(pairs):]))
+
+    # The players from best to worst by Glicko rating
+    def standings(self):
+        table = []
+        for name in self.names:
+            stats = self.stats[name]
+            table.append({'name': name, 'glicko': self.glicko.rating(name), 'deviation': self.glicko.deviation(name),
+                          'elo': self.elo.rating(name), 'games': stats['games'], 'wins': stats['wins'],
+                          'pointsPerGame': stats['points'] / stats['games'] if stats['games'] else 0.0})
+        return sorted(table, key=lambda row: -row['glicko'])
+
+    def report(self):
+        print("{:15} {:>8} {:>6} {:>8} {:>6} {:>6} {:>9}".format("Player", "Glicko", "RD", "Elo", "Games", "Wins",
+                                                                "Pts/game"))
+        for row in self.standings():
+            print("{:15} {:>8.1f} {:>6.1f} {:>8.1f} {:>6} {:>6} {:>+9.2f}".format(
+                row['name'], row['glicko'], row['deviation'], row['elo'], row['games'], row['wins'],
+                row['pointsPerGame']))
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Cribbage tournament")
+    parser.add_argument('--players', nargs='+', choices=sorted(PLAYERS), default=['Random', 'Myrmidon', 'AI',
+                                                                                   'DiscardTable'])
+    parser.add_argument('--format', choices=[ROUND_ROBIN, SWISS], default=ROUND_ROBIN)
+    parser.add_argument('--rounds', type=int, help="rounds to play (default: a full round robin, or log2 of "
+                                                   "the number of players for Swiss)")
+    parser.add_argument('--games', type=int, default=10, help="deals per match, each played from both seats")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int)
+    arguments = parser.parse_args(arguments)
+
+    tournament = Tournament(PLAYERS, arguments.players, arguments.format, arguments.games, arguments.rounds,
+                            arguments.workers, arguments.seed)
+    tournament.run()
+    tournament.report()
+
+if __name__ == '__main__':
+    main()
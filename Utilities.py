@@ -11,7 +11,7 @@
 #
 # Dependencies:
 #    - Deck.py (in local project)
-#    - numpy (standard python library)
+#    - numpy (third party library)
 #    - random (standard python library)
 #
 ################################################################################
@@ -16,7 +16,7 @@
 #    - Deck.py (in local project)
 #    - Arena.py (in local project)          * - for __name__ = '__main__' only
 #    - Myrmidon.py (in local project)       * - for __name__ = '__main__' only
-#    - numpy (standard python library)      * - for __name__ = '__main__' only
+#    - numpy (third party library)          * - for __name__ = '__main__' only
 #    - random (standard python library)
 #    - matplotlib (standard python library) * - for __name__ = '__main__' only
 #